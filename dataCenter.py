@@ -5,8 +5,23 @@ from mip import *
 import math
 import logging
 import json
+import numpy as np
+import concurrent.futures
 
 from geometry2D import *
+from setCover import *
+from presolve import *
+
+workerDataCenter = None #DataCenter used by a visibility worker process, see DataCenter.computeVisibleRacksInParallel
+
+def initVisibilityWorker(dataCenter):
+    global workerDataCenter
+    workerDataCenter = dataCenter
+    
+def computeVisibleRacksInWorker(locations):
+    (xs, ys) = locations
+    workerDataCenter.grid.setCandidateLocations(xs, ys)
+    return list(workerDataCenter.computeVisibleRacks(range(len(xs))))
 
 class Rack:
     #Guarding Directions
@@ -25,6 +40,7 @@ class Rack:
     def __init__(self, seg, direction = LEFT):
         self.seg = seg
         self.dir = direction
+        self.cachedCoefficients = None
         
     def toJSON(self):
         return "{\"seg\": " + self.seg.toJSON() + ",\"guarding_dir\": \"" + self.guardingDirToString() + "\"}"
@@ -39,6 +55,15 @@ class Rack:
     def setDir(self, direction):
         self.dir = direction
         
+    def coefficients(self):
+        #(edge, box): edgeCoefficients of the rack's segment and its bounding box (left, top, right, bottom).
+        #Cached, and only recomputed if the segment has moved (racks grow during placement)
+        seg = self.seg
+        if self.cachedCoefficients == None or self.cachedCoefficients[0][:4] != (seg.x1, seg.y1, seg.x2, seg.y2):
+            self.cachedCoefficients = (edgeCoefficients(seg.x1, seg.y1, seg.x2, seg.y2),
+                                       (min(seg.x1, seg.x2), min(seg.y1, seg.y2), max(seg.x1, seg.x2), max(seg.y1, seg.y2)))
+        return self.cachedCoefficients
+        
     def draw(self, tt, boundingRect, withTickies=True):
         #at this point just draws vertical racks
         orig_color = tt.color()
@@ -151,10 +176,240 @@ class Guard:  #also known as a camera. Class used both for the candidate and sel
                                          filled=True, color=drawingColor)
             
             
+class GuardingCone:
+    """The guarding triangle from a guard location to a rack, set up once to be tested against many occluders.
+    
+    Keeps the coefficients of the triangle's edges (guard to pt1, the rack itself, pt2 back to the
+    guard) and its bounding box.  blockedBy(occluder) answers Triangle.intersectsWithSegment for
+    the occluding rack: an occluder whose bounding box misses the cone's costs a few comparisons,
+    the others get the robust orientation tests with the differences already worked out.  The box
+    test is skipped for a degenerate cone (guard on the rack's line), as Triangle.pointInside then
+    accepts any point on that line.
+    """
+    
+    __slots__ = ("edges", "left", "top", "right", "bottom", "degenerate")
+    
+    def __init__(self, gx, gy, rack):
+        (rackEdge, (left, top, right, bottom)) = rack.coefficients()
+        (ax, ay, bx, by) = rackEdge[:4]
+        self.edges = (edgeCoefficients(gx, gy, ax, ay), rackEdge, edgeCoefficients(bx, by, gx, gy))
+        self.left = min(left, gx)
+        self.top = min(top, gy)
+        self.right = max(right, gx)
+        self.bottom = max(bottom, gy)
+        self.degenerate = edgeOrientationSign(rackEdge, gx, gy) == 0
+        
+    def blockedBy(self, occluder):
+        (occluderEdge, (left, top, right, bottom)) = occluder.coefficients()
+        if not self.degenerate and (right < self.left or left > self.right or bottom < self.top or top > self.bottom):
+            return False
+        (sx1, sy1, sx2, sy2) = occluderEdge[:4]
+        (e1, e2, e3) = self.edges
+        a1 = edgeOrientationSign(e1, sx1, sy1)
+        a2 = edgeOrientationSign(e2, sx1, sy1)
+        a3 = edgeOrientationSign(e3, sx1, sy1)
+        if a1 == a2 and a2 == a3: #an endpoint inside
+            return True
+        b1 = edgeOrientationSign(e1, sx2, sy2)
+        b2 = edgeOrientationSign(e2, sx2, sy2)
+        b3 = edgeOrientationSign(e3, sx2, sy2)
+        if b1 == b2 and b2 == b3:
+            return True
+        p1 = edgeOrientationSign(occluderEdge, e1[0], e1[1]) #the triangle's vertices against the occluder's line
+        p2 = edgeOrientationSign(occluderEdge, e2[0], e2[1])
+        p3 = edgeOrientationSign(occluderEdge, e3[0], e3[1])
+        return (p1 != p2 and a1 != b1) or (p2 != p3 and a2 != b2) or (p3 != p1 and a3 != b3)
+        
+
+class RackVisibilityRegion:
+    """Exact region of guard locations whose guarding triangle to one rack meets no other rack, kept as clauses.
+    
+    For a guard g off the rack's line, the triangle (g, a, b) misses an occluder s exactly when some
+    line separates them, and the separating line can be taken through an edge of either one.  With
+    sigma = the side of line(a, b) that g is on, each such condition is a pair of half-planes in g:
+        line(a, b):  s strictly behind the rack  (does not depend on g, so s is dropped for that side)
+        line(g, a):  g strictly on the sigma-opposite side of line(a, s1) and of line(a, s2)
+        line(b, g):  likewise for line(s1, b) and line(s2, b)
+        line(s):     g strictly on the same side of s's line as a and b
+    The region for a side is therefore the intersection, over the occluders not behind the rack, of
+    the union of these clauses: the rack's half-plane minus the shadows of the other racks.
+    The guarding side restriction itself is left to DataCenter.guardingSideMask.
+    
+    No polygon is built: classify evaluates these clauses for every (location, occluder) pair, so it
+    is the brute force of the vectorized engine reorganised per rack, O(N*R) per rack for N locations.
+    classify also reports locations lying exactly on one of the lines involved (or on the rack's
+    line); there the triangle test has boundary conventions of its own and should be used instead.
+    An occluder can only block guards whose triangles reach its bounding box, so classify takes the
+    locations in spatially compact chunks and drops, per chunk, the occluders outside the bounding
+    box of the chunk and the rack.
+    """
+    
+    CHUNK_SIZE = 1024  #locations classified together against the occluders near them
+    TILES = 16  #classify orders the locations by tile of a TILES x TILES grid over their bounding box
+    
+    def __init__(self, racks, rack_index):
+        seg = racks[rack_index].seg
+        (self.ax, self.ay, self.bx, self.by) = (seg.x1, seg.y1, seg.x2, seg.y2)
+        self.exactTestOnly = (seg.x1 == seg.x2 and seg.y1 == seg.y2)
+        self.occluders = {}  #side of the rack's line -> array of (s1x, s1y, s2x, s2y, tau) rows
+        self.occluderBoxes = {}  #side of the rack's line -> array of (left, top, right, bottom) rows, one per occluder
+        rows = {1: [], -1: []}
+        for k in range(len(racks)):
+            if k == rack_index:
+                continue
+            occ = racks[k].seg
+            side1 = self.cross(self.ax, self.ay, self.bx, self.by, occ.x1, occ.y1)
+            side2 = self.cross(self.ax, self.ay, self.bx, self.by, occ.x2, occ.y2)
+            if side1 == 0 and side2 == 0 and min(occ.x1, occ.x2) <= max(seg.x1, seg.x2) and min(seg.x1, seg.x2) <= max(occ.x1, occ.x2) \
+                    and min(occ.y1, occ.y2) <= max(seg.y1, seg.y2) and min(seg.y1, seg.y2) <= max(occ.y1, occ.y2):
+                self.exactTestOnly = True  #overlapping colinear racks
+            #tau is the side of the occluder's line holding both rack endpoints, or 0 if there is none
+            tauA = np.sign(self.cross(occ.x1, occ.y1, occ.x2, occ.y2, self.ax, self.ay))
+            tauB = np.sign(self.cross(occ.x1, occ.y1, occ.x2, occ.y2, self.bx, self.by))
+            tau = tauA if tauA == tauB else 0.0
+            for sigma in (1, -1):
+                if not (sigma*side1 < 0 and sigma*side2 < 0):
+                    rows[sigma].append((occ.x1, occ.y1, occ.x2, occ.y2, tau))
+        for sigma in (1, -1):
+            self.occluders[sigma] = np.array(rows[sigma], dtype=float).reshape(len(rows[sigma]), 5)
+            occ = self.occluders[sigma]
+            self.occluderBoxes[sigma] = np.column_stack((np.minimum(occ[:, 0], occ[:, 2]), np.minimum(occ[:, 1], occ[:, 3]),
+                                                         np.maximum(occ[:, 0], occ[:, 2]), np.maximum(occ[:, 1], occ[:, 3])))
+            
+    @staticmethod
+    def cross(px, py, qx, qy, rx, ry): #1 when p, q, r turn counter-clockwise, -1 clockwise, 0 colinear (works on numpy arrays too)
+        return -orientationArray(px, py, qx, qy, rx, ry) #the robust signs, so exactly the triangle test's boundary cases are reported
+        
+    def classify(self, gx, gy):
+        """Return boolean arrays (inside, onBoundary) for the guard locations (gx, gy)."""
+        inside = np.zeros(gx.shape, dtype=bool)
+        sides = np.sign(self.cross(self.ax, self.ay, self.bx, self.by, gx, gy))
+        onBoundary = (sides == 0) | self.exactTestOnly
+        for sigma in (1, -1):
+            rows = np.flatnonzero(sides == sigma)
+            if len(rows) == 0:
+                continue
+            if len(self.occluders[sigma]) == 0:
+                inside[rows] = True
+                continue
+            rows = rows[self.tileOrder(gx[rows], gy[rows])]
+            for start in range(0, len(rows), RackVisibilityRegion.CHUNK_SIZE):
+                self.classifyChunk(sigma, rows[start:start + RackVisibilityRegion.CHUNK_SIZE], gx, gy, inside, onBoundary)
+        return (inside, onBoundary)
+        
+    @staticmethod
+    def tileOrder(xs, ys): #order of the locations by tile, so that consecutive ones are close together
+        tiles = RackVisibilityRegion.TILES
+        width = max(xs.max() - xs.min(), 1e-12)
+        height = max(ys.max() - ys.min(), 1e-12)
+        tileXs = np.minimum(((xs - xs.min())*(tiles/width)).astype(np.int64), tiles - 1)
+        tileYs = np.minimum(((ys - ys.min())*(tiles/height)).astype(np.int64), tiles - 1)
+        return np.argsort(tileXs*tiles + tileYs, kind="stable")
+        
+    def classifyChunk(self, sigma, rows, gx, gy, inside, onBoundary):
+        #classify for the locations rows (all on side sigma), against the occluders that can reach their triangles
+        x = gx[rows]
+        y = gy[rows]
+        boxes = self.occluderBoxes[sigma]
+        near = ((boxes[:, 2] >= min(x.min(), self.ax, self.bx)) & (boxes[:, 0] <= max(x.max(), self.ax, self.bx))
+                & (boxes[:, 3] >= min(y.min(), self.ay, self.by)) & (boxes[:, 1] <= max(y.max(), self.ay, self.by)))
+        occ = self.occluders[sigma][near]
+        if len(occ) == 0:
+            inside[rows] = True
+            return
+        x = x[:, None]
+        y = y[:, None]
+        (s1x, s1y, s2x, s2y, tau) = (occ[:, 0], occ[:, 1], occ[:, 2], occ[:, 3], occ[:, 4])
+        a1 = sigma*self.cross(self.ax, self.ay, s1x, s1y, x, y)
+        a2 = sigma*self.cross(self.ax, self.ay, s2x, s2y, x, y)
+        b1 = sigma*self.cross(s1x, s1y, self.bx, self.by, x, y)
+        b2 = sigma*self.cross(s2x, s2y, self.bx, self.by, x, y)
+        s = tau*self.cross(s1x, s1y, s2x, s2y, x, y)
+        separated = ((a1 < 0) & (a2 < 0)) | ((b1 < 0) & (b2 < 0)) | (s > 0)
+        inside[rows] = separated.all(axis=1)
+        onLine = (a1 == 0) | (a2 == 0) | (b1 == 0) | (b2 == 0) | ((tau != 0) & (s == 0))
+        onBoundary[rows] |= onLine.any(axis=1)
+        
+
+class QuadtreeCell: #node of the adaptive grid refinement, the leaves are the grid cells
+    def __init__(self, bounds, depth=0):
+        self.bounds = bounds #(left, top, right, bottom)
+        self.depth = depth #number of splits from the initial grid cell
+        self.children = []
+        
+    def split(self):
+        (left, top, right, bottom) = self.bounds
+        midX = (left + right)/2.0
+        midY = (top + bottom)/2.0
+        self.children = [QuadtreeCell(bounds, self.depth + 1) for bounds in
+                         [(left, top, midX, midY), (midX, top, right, midY), (left, midY, midX, bottom), (midX, midY, right, bottom)]]
+        
+    def leaves(self):
+        if len(self.children) == 0:
+            yield self
+        else:
+            for child in self.children:
+                yield from child.leaves()
+                
+
+class LocationTable: #numbers (x, y) locations in order of insertion, looked up with numpy instead of a dict of tuples
+    def __init__(self):
+        self.keys = np.zeros(0, dtype=complex) #the locations packed as x + iy, sorted
+        self.order = np.zeros(0, dtype=np.int64) #number of the location at each position of keys
+        
+    def __len__(self):
+        return len(self.keys)
+        
+    @staticmethod
+    def pack(xs, ys):
+        keys = np.empty(len(xs), dtype=complex)
+        keys.real = xs
+        keys.imag = ys
+        return keys
+        
+    def positions(self, keys): #positions in self.keys where the given keys are (or would be), and whether they are there
+        if len(self.keys) == 0:
+            return (np.zeros(len(keys), dtype=np.int64), np.zeros(len(keys), dtype=bool))
+        positions = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return (positions, self.keys[positions] == keys)
+        
+    def indicesOf(self, xs, ys):
+        #number of the location (xs[k], ys[k]) for every k, -1 if it is not in the table
+        (positions, found) = self.positions(LocationTable.pack(xs, ys))
+        indices = np.full(len(positions), -1, dtype=np.int64)
+        indices[found] = self.order[positions[found]]
+        return indices
+        
+    def add(self, xs, ys):
+        #numbers the given locations that are not in the table yet, in order of first occurrence, and
+        #returns their positions in xs and ys
+        (keys, first) = np.unique(LocationTable.pack(xs, ys), return_index=True)
+        (positions, found) = self.positions(keys)
+        first = np.sort(first[~found])
+        keys = np.concatenate((self.keys, LocationTable.pack(np.asarray(xs)[first], np.asarray(ys)[first])))
+        order = np.concatenate((self.order, np.arange(len(self.keys), len(keys), dtype=np.int64)))
+        sortedPositions = np.argsort(keys, kind="stable")
+        self.keys = keys[sortedPositions]
+        self.order = order[sortedPositions]
+        return first
+                
+
 class DataCenterGrid:
     GRID_COLOR = "grey"
     
-    def __init__(self, bdingRect, racks = []):
+    #Refinement
+    REFINE_GLOBAL = -1  #refineGrid adds grid lines through all cell centers, so every cell splits into 4
+    REFINE_ADAPTIVE = -2  #quadtree, refineGrid only splits the cells it is given
+    MAX_QUADTREE_DEPTH = 10
+    
+    nextGeneration = 0 #for candidateGeneration, shared by all grids so a new grid never repeats an old one's
+    
+    # Cells and candidate guards are kept in numpy arrays rather than as Rect and Guard objects:
+    # cells[c] = (left, top, right, bottom), and candidate guard j is at (candidateXs[j], candidateYs[j])
+    # and is selected iff selected[j].  Guard and Rect objects are only made for drawing and
+    # serializing (candidateGuard, cellRect).
+    
+    def __init__(self, bdingRect, racks = [], retainCandidates=False, refinement=REFINE_GLOBAL):
         self.vertices = set()
         for rack in racks:
             for endpt in rack.seg.endpoints():
@@ -167,19 +422,48 @@ class DataCenterGrid:
             self.y_crosspts.add(vertex.y)
         self.boundingRect = bdingRect
         self.rackSet = racks
-        self.cells = []
-        self.candidateGuardSet = []
+        self.cells = np.zeros((0, 4), dtype=float)
+        self.candidateXs = np.zeros(0, dtype=float)
+        self.candidateYs = np.zeros(0, dtype=float)
+        self.selected = np.zeros(0, dtype=bool)
+        self.retainCandidates = retainCandidates #keep the candidates of earlier grid levels after refining
+        self.locations = LocationTable() #numbers the candidate guards by location
+        self.candidateGeneration = self.newGeneration() #changes whenever the candidates are replaced, rather than appended to
+        self.visibleRacks = np.zeros(0, dtype=object) #jth entry is the tuple of racks candidate j sees, None until DataCenter.generateGuardingMatrix computes it
+        self.rackGuardSets = [] #ith entry lists the candidate guards that can see the ith rack
+        self.reducedColumns = None #candidates kept by DataCenter.reduceCandidates, None if not reduced
+        self.reducedRackSets = None #rackGuardSets restated over positions in reducedColumns
+        self.newCandidates = np.zeros(0, dtype=np.int64) #indices of the candidates that were not candidates before the last generateCandidateGuardSet
+        self.refinement = refinement
+        self.quadtree = [] #with REFINE_ADAPTIVE, one QuadtreeCell per cell of the initial grid
+        self.leaves = [] #with REFINE_ADAPTIVE, the QuadtreeCell of each row of cells
         
-    def refineGrid(self): # Refine by splitting every cell into 4 congruent rectangular pieces
+    def refineGrid(self, cellIndices=None): # Refine by splitting every cell into 4 congruent rectangular pieces
+        # With REFINE_ADAPTIVE only the cells with the given indices (into self.cells, all of them
+        # if None) are split, up to MAX_QUADTREE_DEPTH; returns the number of cells split
+        if self.refinement == DataCenterGrid.REFINE_ADAPTIVE:
+            if cellIndices == None:
+                cellIndices = range(len(self.leaves))
+            numSplit = 0
+            for i in cellIndices:
+                if self.leaves[i].depth < DataCenterGrid.MAX_QUADTREE_DEPTH:
+                    self.leaves[i].split()
+                    numSplit += 1
+            return numSplit
+            
         # Place an additional vertex at the center of the original set of cells, 
         # add to x_crosspots and y_crosspts and we're done!
-        for cell in self.cells:
-            midpt = cell.center()
-            self.vertices.add(midpt)
-            self.x_crosspts.add(midpt.x)
-            self.y_crosspts.add(midpt.y)
+        (centerXs, centerYs) = self.cellCenters()
+        self.x_crosspts.update(centerXs.tolist())
+        self.y_crosspts.update(centerYs.tolist())
+        return len(self.cells)
         
     def getCells(self):
+        if self.refinement == DataCenterGrid.REFINE_ADAPTIVE and len(self.quadtree) > 0:
+            self.leaves = [leaf for root in self.quadtree for leaf in root.leaves()]
+            self.cells = np.array([leaf.bounds for leaf in self.leaves], dtype=float).reshape(len(self.leaves), 4)
+            return self.cells
+            
         x_crosses = [self.boundingRect.left]
         for x_cross in self.x_crosspts:
             x_crosses.append(x_cross) 
@@ -191,26 +475,122 @@ class DataCenterGrid:
         y_crosses.append(self.boundingRect.bottom)
         y_crosses.sort()
         
-        self.cells.clear()
-        for i in range(len(x_crosses) - 1):
-            for j in range(len(y_crosses) - 1):
-                topLeft = Point(x_crosses[i], y_crosses[j])
-                bottomRight = Point(x_crosses[i+1], y_crosses[j+1])
-                self.cells.append(Rect(topLeft, bottomRight))
+        x_crosses = np.array(x_crosses, dtype=float)
+        y_crosses = np.array(y_crosses, dtype=float)
+        numRows = len(y_crosses) - 1
+        self.cells = np.empty(((len(x_crosses) - 1)*numRows, 4), dtype=float) #column by column, as before
+        self.cells[:, 0] = np.repeat(x_crosses[:-1], numRows)
+        self.cells[:, 1] = np.tile(y_crosses[:-1], len(x_crosses) - 1)
+        self.cells[:, 2] = np.repeat(x_crosses[1:], numRows)
+        self.cells[:, 3] = np.tile(y_crosses[1:], len(x_crosses) - 1)
         
+        if self.refinement == DataCenterGrid.REFINE_ADAPTIVE: #the initial grid becomes the roots of the quadtree
+            self.quadtree = [QuadtreeCell(tuple(bounds)) for bounds in self.cells.tolist()]
+            self.leaves = list(self.quadtree)
         return self.cells
         
+    def cellCenters(self):
+        return ((self.cells[:, 0] + self.cells[:, 2])/2.0, (self.cells[:, 1] + self.cells[:, 3])/2.0)
+        
+    def cellRect(self, c):
+        (left, top, right, bottom) = self.cells[c].tolist()
+        return Rect(Point(left, top), Point(right, bottom))
+        
     def generateCandidateGuardSet(self):
+        # Cell centers that were already candidates carry over; with retainCandidates the earlier
+        # candidates are kept too, at their old indices, and new centers are appended after them
         self.getCells()
-        self.candidateGuardSet.clear()
-        for cell in self.cells:
-            self.candidateGuardSet.append(Guard(cell.center()))
-        return self.candidateGuardSet
+        (centerXs, centerYs) = self.cellCenters()
+        if self.retainCandidates:
+            self.newCandidates = self.addCandidates(centerXs, centerYs)
+        else:
+            self.setCandidateLocations(centerXs, centerYs)
+        return self.numCandidates()
+        
+    def generateArrangementCandidateSet(self, xs, ys):
+        # Candidates at the given locations (one per face of DataCenter.criticalSegments) instead of
+        # at the cell centers; the cells themselves are left alone, for drawing
+        self.setCandidateLocations(xs, ys)
+        return self.numCandidates()
+        
+    def addCandidates(self, xs, ys):
+        #appends unselected candidate guards at those of the given locations that are not candidates yet,
+        #in order, and returns their indices
+        numCandidates = self.numCandidates()
+        added = self.locations.add(xs, ys)
+        self.candidateXs = np.concatenate((self.candidateXs, np.asarray(xs, dtype=float)[added]))
+        self.candidateYs = np.concatenate((self.candidateYs, np.asarray(ys, dtype=float)[added]))
+        self.selected = np.concatenate((self.selected, np.zeros(len(added), dtype=bool)))
+        self.visibleRacks = np.concatenate((self.visibleRacks, np.full(len(added), None, dtype=object)))
+        return np.arange(numCandidates, self.numCandidates())
+        
+    def setCandidateLocations(self, xs, ys):
+        #replaces all candidate guards by ones at the given locations (duplicates dropped).  The visible racks
+        #of locations that were candidates before carry over; newCandidates lists the others
+        previousLocations = self.locations
+        previousRacks = self.visibleRacks
+        self.locations = LocationTable()
+        self.candidateGeneration = self.newGeneration()
+        self.candidateXs = np.zeros(0, dtype=float)
+        self.candidateYs = np.zeros(0, dtype=float)
+        self.selected = np.zeros(0, dtype=bool)
+        self.visibleRacks = np.zeros(0, dtype=object)
+        self.addCandidates(xs, ys)
+        previousIndices = previousLocations.indicesOf(self.candidateXs, self.candidateYs)
+        carried = previousIndices >= 0
+        self.visibleRacks[carried] = previousRacks[previousIndices[carried]]
+        self.newCandidates = np.nonzero(~carried)[0]
+        
+    @staticmethod
+    def newGeneration():
+        DataCenterGrid.nextGeneration += 1
+        return DataCenterGrid.nextGeneration
+        
+    def numCandidates(self):
+        return len(self.candidateXs)
+        
+    def candidateIndices(self, xs, ys):
+        #index of the candidate guard at each of the given locations, -1 where there is none
+        return self.locations.indicesOf(xs, ys)
+        
+    def candidateLocation(self, j):
+        return (float(self.candidateXs[j]), float(self.candidateYs[j]))
+        
+    def candidateLocations(self): #(xs, ys), the arrays themselves rather than copies
+        return (self.candidateXs, self.candidateYs)
+        
+    def candidateGuard(self, j): #a Guard object for candidate j, for drawing or serializing
+        guard = Guard(Point(*self.candidateLocation(j)))
+        guard.selected = bool(self.selected[j])
+        return guard
         
+    def clearSelection(self):
+        self.selected[:] = False
+        
+    def selectCandidates(self, indices):
+        self.selected[np.array(list(indices), dtype=np.int64)] = True
+        
+    def selectedCandidates(self):
+        return np.nonzero(self.selected)[0].tolist()
+        
+    def getDenseGuardingMatrix(self): #0/1 view of rackGuardSets, for debugging
+        guardingMatrix = []
+        for rackGuards in self.rackGuardSets:
+            row = [0] * self.numCandidates()
+            for j in rackGuards:
+                row[j] = 1
+            guardingMatrix.append(row)
+        return guardingMatrix
             
     def draw(self, turtle, boundingRect):
         turtle.color(DataCenterGrid.GRID_COLOR)
         
+        if self.refinement == DataCenterGrid.REFINE_ADAPTIVE:
+            for c in range(len(self.cells)):
+                self.cellRect(c).draw(turtle)
+            turtle.color("black")
+            return
+            
         for x in self.x_crosspts:
             topPt = Point(x, boundingRect.top)
             bottomPt = Point(x, boundingRect.bottom)
@@ -226,8 +606,12 @@ class DataCenterGrid:
         turtle.color("black") #default color
         
     def drawGuardSet(self, turtle, boundingRect, drawCandidateGuards):
-        for guard in self.candidateGuardSet:
-            guard.draw(turtle, boundingRect, drawCandidateGuards)
+        if drawCandidateGuards:
+            guardIndices = range(self.numCandidates())
+        else:
+            guardIndices = self.selectedCandidates()
+        for j in guardIndices:
+            self.candidateGuard(j).draw(turtle, boundingRect, drawCandidateGuards)
             
         
 
@@ -247,6 +631,33 @@ class DataCenter:
     GROW_TOGETHER = -1
     GROW_ONE_BY_ONE = -2
     
+    VISIBILITY_SCALAR = -1  #one guardCanSeeRack call per (guard, rack) pair
+    VISIBILITY_VECTORIZED = -2  #numpy evaluation over blocks of candidate guards
+    VISIBILITY_REGIONS = -4  #per rack, all candidates against the separating-line clauses of RackVisibilityRegion (brute force, no polygons)
+    
+    SOLVE_MIP = -1  #CBC on the presolved cover instance
+    SOLVE_HEURISTIC = -2  #greedy and LP rounding with redundancy elimination, no optimality proof
+    SOLVE_COLUMN_GENERATION = -3  #CBC over the candidate guards priced in by the LP duals
+    SOLVE_BRANCH_AND_BOUND = -4  #in-process bitset branch and bound (setCover.exactSetCover), for few racks
+    SOLVE_AUTO = -5  #SOLVE_BRANCH_AND_BOUND up to EXACT_SOLVER_MAX_RACKS racks after presolve, SOLVE_MIP beyond
+    SOLVE_INCREMENTAL_MIP = -6  #one CBC model kept across refinements, new candidates added as columns (no presolve)
+    
+    STOP_UNCHANGED = -1  #refineUntilConverged: the number of guards stopped changing (or the grid did)
+    STOP_LOWER_BOUND = -2  #the number of guards reached the lower bound
+    STOP_TIME_BUDGET = -3
+    STOP_CANDIDATE_BUDGET = -4
+    STOP_MAX_ITERATIONS = -5
+    
+    COLUMN_GENERATION_BATCH = 50  #most negative reduced cost columns added per pricing round
+    ANYTIME_FIRST_SLICE = 0.25  #seconds of the first CBC run of improvingGuardSets, doubled for every further run
+    EXACT_SOLVER_MAX_RACKS = 40
+    EXACT_SOLVER_MAX_NODES = 100000  #beyond this (about a second) the branch and bound hands over to the MIP
+    
+    VECTORIZED_BLOCK_SIZE = 2048  #number of candidate guards tested together by the vectorized engine
+    PARALLEL_MIN_CANDIDATES = 2048  #fewer candidate guards than this are not worth starting a process pool for
+    PARALLEL_TASKS_PER_WORKER = 4  #the guards are split into this many tasks per worker, so the pool stays evenly loaded
+    OCCLUDER_INDEX_MIN_RACKS = 100  #guardCanSeeRack queries the rack index from this many racks on; below, GuardingCone's box test on every rack is cheaper
+    
     def __init__(self, rect, eps=2):
         self.boundaryRect = rect
         self.epsilon = eps
@@ -255,6 +666,17 @@ class DataCenter:
         self.guardingModel = DataCenter.POSERS_CHOICE #default
         self.coverage = DataCenter.COMPLETE_COVERAGE
         self.delta = 0.0
+        self.visibilityEngine = DataCenter.VISIBILITY_SCALAR
+        self.numVisibilityWorkers = 1
+        self.rackIndex = None
+        self.probeLocations = LocationTable() #locations other than candidates whose visibility was computed, e.g. cell corners
+        self.probeRacks = np.zeros(0, dtype=object) #tuple of the racks seen from each location of probeLocations
+        self.visibilityRegions = {} #rack index -> RackVisibilityRegion, independent of the grid
+        self.solveMode = DataCenter.SOLVE_AUTO
+        self.heuristicLPRounding = True
+        self.guardLowerBound = None #lower bound on the minimum number of guards for the last findMinimalGuardSet
+        self.refinementStopReason = None #why the last refineUntilConverged stopped, one of the STOP_ constants
+        self.resetCoverModel()
         
     def toJSON(self):
         json = "{\"boundary_rect\": " + self.boundaryRect.toJSON()
@@ -340,16 +762,40 @@ class DataCenter:
         return dataCenter
         
     def getSelectedGuards(self):
-        selectedGuards = []
-        for candidateGuard in self.grid.candidateGuardSet:
-            if candidateGuard.selected:
-                selectedGuards.append(candidateGuard)
-        return selectedGuards
+        return [self.grid.candidateGuard(j) for j in self.grid.selectedCandidates()]
          
     def setGuardingModel(self, model, coverageType, delta):
         self.guardingModel = model
         self.coverage = coverageType
         self.delta = delta
+        self.clearVisibilityCache()
+        
+    def clearVisibilityCache(self): #needed whenever the racks or the guarding semantics change
+        self.grid.visibleRacks[:] = None
+        self.probeLocations = LocationTable()
+        self.probeRacks = np.zeros(0, dtype=object)
+        self.visibilityRegions = {}
+        self.resetCoverModel()
+        
+    def resetCoverModel(self): #drops the persistent model of SOLVE_INCREMENTAL_MIP
+        self.coverModel = None
+        self.coverModelRows = [] #ith entry is the cover constraint of rack i
+        self.coverModelColumns = [] #candidate guard index of each variable
+        self.coverModelMasks = set() #rack bitmasks of the variables
+        self.coverModelMasksByRack = [] #ith entry lists the masks of the variables seeing rack i
+        self.coverModelNumCandidates = 0 #candidates 0 .. coverModelNumCandidates-1 have been considered
+        self.coverModelGeneration = None #grid.candidateGeneration those candidates belong to
+        self.coverModelSolution = [] #variables selected by the last solve
+        
+    def setVisibilityEngine(self, engine):
+        self.visibilityEngine = engine
+        
+    def setNumVisibilityWorkers(self, numWorkers): #more than 1 computes visibility in a process pool
+        self.numVisibilityWorkers = numWorkers
+        
+    def setSolveMode(self, solveMode, lpRounding=True): #lpRounding only matters for SOLVE_HEURISTIC
+        self.solveMode = solveMode
+        self.heuristicLPRounding = lpRounding
         
     def placeRandomHStyleOrthogonalRacks(self, num):
         random.seed()
@@ -631,152 +1077,965 @@ class DataCenter:
             else:
                 return Rack.LEFT
             
-    def createInitialGrid(self):
-        self.grid = DataCenterGrid(self.boundaryRect, self.racks)
+    def createInitialGrid(self, retainCandidates=False, refinement=DataCenterGrid.REFINE_GLOBAL):
+        self.grid = DataCenterGrid(self.boundaryRect, self.racks, retainCandidates, refinement)
+        self.rackIndex = SegmentGridIndex([rack.seg for rack in self.racks])
+        self.clearVisibilityCache()
+        
+    def getRackIndex(self):
+        if self.rackIndex == None:
+            self.rackIndex = SegmentGridIndex([rack.seg for rack in self.racks])
+        return self.rackIndex
+        
+    def potentialOccluders(self, rack_index, left, top, right, bottom):
+        #racks other than rack_index whose bounding boxes overlap the given box
+        return [i for i in self.getRackIndex().query(left, top, right, bottom) if i != rack_index]
+        
+    def triangleOccluders(self, gx, gy, rack_index):
+        #racks other than rack_index that could meet the guarding triangle from (gx, gy) to the rack
+        seg = self.racks[rack_index].seg
+        if orientationFromCoordinates(seg.x1, seg.y1, seg.x2, seg.y2, gx, gy) == Segment.COLINEAR:
+            #degenerate triangle: Triangle.pointInside accepts any point on its line, so nothing can be pruned
+            return [i for i in range(len(self.racks)) if i != rack_index]
+        return self.potentialOccluders(rack_index, min(gx, seg.x1, seg.x2), min(gy, seg.y1, seg.y2),
+                                       max(gx, seg.x1, seg.x2), max(gy, seg.y1, seg.y2))
         
     def guardCanSeeRack(self, guard_index, rack_index):  #currently just deals with orthog visibility
         # covers case of full coverage only
         if self.coverage == DataCenter.ALL_BUT_DELTA_COVERAGE:
             return self.guardCanSeeRackExceptForDelta(guard_index, rack_index)
         
-        guard = self.grid.candidateGuardSet[guard_index]
+        (gx, gy) = self.grid.candidateLocation(guard_index)
         rack = self.racks[rack_index]
         # first check that guard is on right side of rack
-        logging.debug("Guard " + guard.toJSON())
-        logging.debug("Rack " + rack.toJSON())
+        if logging.getLogger().isEnabledFor(logging.DEBUG): #the JSON would otherwise be built on every call
+            logging.debug("Guard " + self.grid.candidateGuard(guard_index).toJSON())
+            logging.debug("Rack " + rack.toJSON())
         
-        if self.guardingModel == DataCenter.POSERS_CHOICE:
-            if rack.dir == Rack.RIGHT and guard.loc.x <= rack.seg.x1:
-                logging.debug("CANNOT GUARD: WRONG SIDE!")
-                return False
-            elif rack.dir == Rack.LEFT and guard.loc.x >= rack.seg.x1:
-                logging.debug("CANNOT GUARD: WRONG SIDE!")
-                return False
-            elif rack.dir == Rack.DOWN and guard.loc.y >= rack.seg.y1:
-                logging.debug("CANNOT GUARD: WRONG SIDE!")
-                return False
-            elif rack.dir == Rack.UP and guard.loc.y <= rack.seg.y1:
-                logging.debug("CANNOT GUARD: WRONG SIDE!")
-                return False
+        if not self.isOnGuardingSide(Point(gx, gy), rack):
+            logging.debug("CANNOT GUARD: WRONG SIDE!")
+            return False
         
-        guardingTriangle = Triangle(guard.loc, Point(rack.seg.x1, rack.seg.y1),
-                                             Point(rack.seg.x2, rack.seg.y2))
-        for i in range(len(self.racks)):
-            if i != rack_index:
-                if(guardingTriangle.intersectsWithSegment(self.racks[i].seg)):
-                    logging.debug("CANNOT GUARD! The following rack is blocking: " + rack.toJSON())
-                    return False
+        cone = GuardingCone(gx, gy, rack)
+        if cone.degenerate or len(self.racks) < DataCenter.OCCLUDER_INDEX_MIN_RACKS: #see triangleOccluders for the degenerate case
+            occluders = [i for i in range(len(self.racks)) if i != rack_index]
+        else:
+            occluders = self.potentialOccluders(rack_index, cone.left, cone.top, cone.right, cone.bottom)
+        for i in occluders:
+            if cone.blockedBy(self.racks[i]):
+                logging.debug("CANNOT GUARD! The following rack is blocking: " + rack.toJSON())
+                return False
         logging.debug("SUCCESSFUL GUARD!")
         return True         
     
     def guardCanSeeRackExceptForDelta(self, guard_index, rack_index): 
-        # covers case of full coverage only
-        guard = self.grid.candidateGuardSet[guard_index]
+        # covers the all-but-delta case: the guard may miss at most delta of the rack's length
+        guardLoc = Point(*self.grid.candidateLocation(guard_index))
         rack = self.racks[rack_index]
-        # first check that guard is on right side of rack
-        logging.debug("Guard " + guard.toString())
-        logging.debug("Rack " + rack.toString())
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("Guard " + self.grid.candidateGuard(guard_index).toJSON())
+            logging.debug("Rack " + rack.toJSON())
         
-        if self.guardingModel == DataCenter.POSERS_CHOICE:
-            if rack.dir == Rack.RIGHT and guard.loc.x <= rack.seg.x1:
-                logging.debug("CANNOT GUARD: WRONG SIDE!")
-                return False
-            elif rack.dir == Rack.LEFT and guard.loc.x >= rack.seg.x1:
-                logging.debug("CANNOT GUARD: WRONG SIDE!")
-                return False
-            elif rack.dir == Rack.DOWN and guard.loc.y >= rack.seg.y1:
-                logging.debug("CANNOT GUARD: WRONG SIDE!")
-                return False
-            elif rack.dir == Rack.UP and guard.loc.y <= rack.seg.y1:
-                logging.debug("CANNOT GUARD: WRONG SIDE!")
-                return False
+        if not self.isOnGuardingSide(guardLoc, rack):
+            logging.debug("CANNOT GUARD: WRONG SIDE!")
+            return False
         
-        guardingTriangle = Triangle(guard.loc, Point(rack.seg.x1, rack.seg.y1),
-                                             Point(rack.seg.x2, rack.seg.y2))
-        for i in range(len(self.racks)):
-            if i != rack_index:
-                pt1Inside = guardingTriangle.pointInside(Point(self.racks[i].seg.x1, self.racks[i].seg.y1))
-                pt2Inside = guardingTriangle.pointInside(Point(self.racks[i].seg.x2, self.racks[i].seg.y2))
-                if not pt1Inside and  not pt2Inside: #case where we see the entire segment or nothing at all
-                    if guardingTriangle.intersectsWithSegment(self.racks[i].seg):
-                        return rack.seg.length() <= self.delta
-                elif pt1Inside and pt2Inside:
-                    rackLine = rack.seg.line()
-                    pointingLine1 = guard.loc.line_through_point(Point(self.racks[i].seg.x1, self.racks[i].seg.y1))
-                    pointingLine2 = guard.loc.line_through_point(Point(self.racks[i].seg.x2, self.racks[i].seg.y2))
-                    ptOnRack1 = rackLine.intersectionWithLine(pointingLine1)
-                    ptOnRack2 = rackLine.intersectionWithLine(pointingLine2)
-                    if ptOnRack1.distance_to(ptOnRack2) > self.delta:
-                        return False
-                elif pt1Inside: #just pt1Inside
-                    rackLine = rack.seg.line()
-                    pointingLine = guard.loc.line_through_point(Point(self.racks[i].seg.x1, self.racks[i].seg.y1))
-                    rackTop = Point(rack.seg.x1, rack.seg.y1)
-                    topGuardingTriangleSeg = Segment(guard.loc, rackTop)
-                    ptOnRack = rackLine.intersectionWithLine(pointingLine)
-                    if topGuardingTriangleSeg.intersectsWithSegment(self.racks[i].seg) and rackTop.distance_to(ptOnRack) > self.delta:
-                        return False
-                    else:
-                        rackBottom = Point(rack.seg.x2, rack.seg.y2)
-                        if rackBottom.distance_to(ptOnRack) > self.delta:
-                            return False
-                else: #just pt2Inside
-                    rackLine = rack.seg.line()
-                    pointingLine = guard.loc.line_through_point(Point(self.racks[i].seg.x2, self.racks[i].seg.y2))
-                    rackTop = Point(rack.seg.x1, rack.seg.y1)
-                    topGuardingTriangleSeg = Segment(guard.loc, rackTop)
-                    ptOnRack = rackLine.intersectionWithLine(pointingLine)
-                    if topGuardingTriangleSeg.intersectsWithSegment(self.racks[i].seg) and rackTop.distance_to(ptOnRack) > self.delta:
-                        return False
-                    else:
-                        rackBottom = Point(rack.seg.x2, rack.seg.y2)
-                        if rackBottom.distance_to(ptOnRack) > self.delta:
-                            return False
-                    
-        logging.debug("SUCCESSFUL GUARD!")
-        return True         
+        hiddenLength = self.hiddenLengthOfRack(guardLoc, rack_index)
+        logging.debug("Hidden length " + str(hiddenLength))
+        return hiddenLength <= self.delta
+    
+    def hiddenLengthOfRack(self, guard_loc, rack_index):
+        #Exact length of rack rack_index hidden from guard_loc by the other racks.  Each occluder is
+        #projected from the guard onto the rack as an interval of the rack's parameter (0 at pt1, 1 at
+        #pt2); the intervals are merged in sorted order and the union's length is returned
+        seg = self.racks[rack_index].seg
+        ux = seg.x2 - seg.x1
+        uy = seg.y2 - seg.y1
+        lengthSq = ux*ux + uy*uy
+        if lengthSq == 0:
+            return 0.0
+        guardHeight = ux*(guard_loc.y - seg.y1) - uy*(guard_loc.x - seg.x1)
+        if guardHeight == 0: #looking along the rack's line
+            return seg.length()
+        
+        intervals = []
+        for k in self.triangleOccluders(guard_loc.x, guard_loc.y, rack_index):
+            interval = self.shadowInterval(guard_loc, seg, self.racks[k].seg, guardHeight)
+            if interval != None:
+                intervals.append(interval)
+        intervals.sort()
+        hidden = 0.0
+        reach = 0.0
+        for (lo, hi) in intervals:
+            hidden += max(0.0, hi - max(lo, reach))
+            reach = max(reach, hi)
+        return hidden * math.sqrt(lengthSq)
+    
+    @staticmethod
+    def shadowInterval(guard_loc, seg, occ, guardHeight):
+        #Parameter interval of seg hidden by the occluder occ, or None.  Heights are measured from seg's
+        #line in units of the guard's height, so only the part of occ with 0 <= h <= 1 can hide anything
+        ux = seg.x2 - seg.x1
+        uy = seg.y2 - seg.y1
+        h1 = (ux*(occ.y1 - seg.y1) - uy*(occ.x1 - seg.x1)) / guardHeight
+        h2 = (ux*(occ.y2 - seg.y1) - uy*(occ.x2 - seg.x1)) / guardHeight
+        dh = h2 - h1
+        if dh == 0:
+            if h1 < 0 or h1 > 1:
+                return None
+            (lo, hi) = (0.0, 1.0)
+        else:
+            lo = max(0.0, min(-h1/dh, (1 - h1)/dh))
+            hi = min(1.0, max(-h1/dh, (1 - h1)/dh))
+            if lo > hi:
+                return None
+            
+        guardParam = (ux*(guard_loc.x - seg.x1) + uy*(guard_loc.y - seg.y1)) / (ux*ux + uy*uy)
+        params = []
+        for lam in (lo, hi):
+            dx = occ.x1 + lam*(occ.x2 - occ.x1) - guard_loc.x
+            dy = occ.y1 + lam*(occ.y2 - occ.y1) - guard_loc.y
+            along = ux*dx + uy*dy
+            depth = (1 - min(1.0, max(0.0, h1 + lam*dh))) * (ux*ux + uy*uy) #clamped so rounding cannot cross the guard's line
+            if depth == 0: #on the guard's parallel line, so it projects to infinity
+                if along == 0: #the guard stands on the occluder
+                    return (0.0, 1.0)
+                params.append(math.copysign(math.inf, along))
+            else:
+                params.append(guardParam + along/depth)
+        lo = min(1.0, max(0.0, min(params)))
+        hi = min(1.0, max(0.0, max(params)))
+        if hi <= lo:
+            return None
+        return (lo, hi)
         
     def generateGuardingMatrix(self):
-        #ijth entry tells whether the jth guard can see ith rack
-        self.grid.guardingMatrix = []
+        #Sparse guarding matrix: grid.rackGuardSets[i] lists, in increasing order, the candidate guards
+        #that can see rack i (grid.getDenseGuardingMatrix() gives the 0/1 view).
+        #Visibility is cached by candidate index (grid.visibleRacks, which carries over the candidates kept by
+        #refining), so only candidates not evaluated before (e.g. the new ones after refineGrid) are streamed
+        #from the visibility engine
+        visibleRacks = self.grid.visibleRacks
+        pending = np.nonzero(visibleRacks == None)[0]
+        logging.info("Computing visibility for " + str(len(pending)) + " of " + str(len(visibleRacks)) + " candidates (" 
+                     + str(len(self.grid.newCandidates)) + " new to the grid)")
+        for (j, racks) in zip(pending.tolist(), self.computeVisibleRacks(pending)):
+            visibleRacks[j] = racks
+        
+        numRacksSeen = np.fromiter((len(racks) for racks in visibleRacks), dtype=np.int64, count=len(visibleRacks))
+        racksSeen = np.fromiter((i for racks in visibleRacks for i in racks), dtype=np.int64, count=int(numRacksSeen.sum()))
+        order = np.argsort(racksSeen, kind="stable") #by rack, then by guard
+        guards = np.repeat(np.arange(len(visibleRacks)), numRacksSeen)[order]
+        bounds = np.searchsorted(racksSeen[order], np.arange(len(self.racks) + 1))
+        self.grid.rackGuardSets = [guards[bounds[i]:bounds[i + 1]].tolist() for i in range(len(self.racks))]
+        self.grid.reducedColumns = None
+        self.grid.reducedRackSets = None
+                
+    def visibleRacksAtLocations(self, xs, ys):
+        #racks seen by a guard at each of the given locations, which need not be candidates.  Candidates
+        #and locations probed before are looked up in the caches, the rest is run through the visibility engine
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        visibleRacks = np.full(len(xs), None, dtype=object)
+        candidates = self.grid.candidateIndices(xs, ys)
+        isCandidate = candidates >= 0
+        visibleRacks[isCandidate] = self.grid.visibleRacks[candidates[isCandidate]]
+        missing = np.nonzero(visibleRacks == None)[0]
+        added = missing[self.probeLocations.add(xs[missing], ys[missing])]
+        if len(added) > 0:
+            probe = self.visibilityWorkerCopy()
+            probe.rackIndex = self.rackIndex
+            probe.visibilityRegions = self.visibilityRegions
+            probe.numVisibilityWorkers = self.numVisibilityWorkers
+            probe.grid.setCandidateLocations(xs[added], ys[added])
+            probeRacks = np.full(len(added), None, dtype=object)
+            for (k, racks) in enumerate(probe.computeVisibleRacks(range(len(added)))):
+                probeRacks[k] = racks
+            self.probeRacks = np.concatenate((self.probeRacks, probeRacks))
+        visibleRacks[missing] = self.probeRacks[self.probeLocations.indicesOf(xs[missing], ys[missing])]
+        return visibleRacks
+        
+    def refineGridAdaptively(self):
+        #REFINE_ADAPTIVE counterpart of grid.refineGrid(): splits only the cells whose four corners do not all
+        #see the same racks (a shadow boundary crosses the cell) or that lie within one cell size of a selected
+        #guard or a rack endpoint.  Returns the number of cells split
+        cells = self.grid.cells
+        cornerRacks = self.visibleRacksAtLocations(cells[:, [0, 2, 0, 2]].ravel(), cells[:, [1, 1, 3, 3]].ravel()) #(left, top), (right, top), (left, bottom), (right, bottom) of each cell
+        
+        points = [self.grid.candidateLocation(j) for j in self.grid.selectedCandidates()]
+        for rack in self.racks:
+            points.extend([(rack.seg.x1, rack.seg.y1), (rack.seg.x2, rack.seg.y2)])
+        (lefts, tops, rights, bottoms) = (cells[:, 0], cells[:, 1], cells[:, 2], cells[:, 3])
+        sizes = np.maximum(rights - lefts, bottoms - tops)
+        near = np.zeros(len(cells), dtype=bool)
+        for (x, y) in points:
+            near |= (lefts - sizes <= x) & (x <= rights + sizes) & (tops - sizes <= y) & (y <= bottoms + sizes)
+        
+        toSplit = []
+        for c in range(len(cells)):
+            if near[c] or len(set(cornerRacks[4*c:4*c + 4])) > 1:
+                toSplit.append(c)
+        numSplit = self.grid.refineGrid(toSplit)
+        logging.info("Adaptive refinement: " + str(numSplit) + " of " + str(len(cells)) + " cells split")
+        return numSplit
+        
+    def criticalSegments(self):
+        #Segments (x1, y1, x2, y2), clipped to boundaryRect, off which the racks a guard sees stay the same:
+        #the line and guarding side boundary of every rack, and for every rack endpoint p and endpoint q of another rack the ray from q
+        #directly away from p, beyond which q's rack starts or stops hiding p.  A ray is dropped if some
+        #other rack already cuts p off from q, ends at the first rack it crosses (p is hidden from there on)
+        #and, under POSERS_CHOICE, is kept only on p's guarding side.  The cut off parts only matter for the
+        #hidden length, so with COMPLETE_COVERAGE every face of these segments sees one set of racks, while
+        #with ALL_BUT_DELTA_COVERAGE its shadows can also end inside a face
+        rect = self.boundaryRect
+        segs = np.array([[rack.seg.x1, rack.seg.y1, rack.seg.x2, rack.seg.y2] for rack in self.racks], dtype=float).reshape(len(self.racks), 4)
+        critical = []
         for i in range(len(self.racks)):
-            rackGuardSet = []
-            for j in range(len(self.grid.candidateGuardSet)):
-                if self.guardCanSeeRack(j, i):
-                    rackGuardSet.append(1)
-                else:
-                    rackGuardSet.append(0)
-            self.grid.guardingMatrix.append(rackGuardSet)        
+            (ax, ay, bx, by) = segs[i].tolist()
+            if (ax, ay) != (bx, by):
+                clipped = DataCenter.clipLine(ax, ay, bx - ax, by - ay, -math.inf, math.inf, rect)
+                if clipped != None:
+                    critical.append(clipped)
+            halfPlane = self.guardingHalfPlane(self.racks[i])
+            if halfPlane != None: #the boundary of the guarding side, which for a slanted rack is not its line
+                clipped = DataCenter.clipLine(ax, ay, -halfPlane[1], halfPlane[0], -math.inf, math.inf, rect)
+                if clipped != None:
+                    critical.append(clipped)
+        
+        for i in range(len(self.racks)):
+            halfPlane = self.guardingHalfPlane(self.racks[i])
+            for (px, py) in ((segs[i, 0], segs[i, 1]), (segs[i, 2], segs[i, 3])):
+                for k in range(len(self.racks)):
+                    if k == i:
+                        continue
+                    others = np.delete(segs, [i, k], axis=0)
+                    for (qx, qy) in ((segs[k, 0], segs[k, 1]), (segs[k, 2], segs[k, 3])):
+                        if (qx, qy) == (px, py):
+                            continue
+                        (dx, dy) = (qx - px, qy - py)
+                        if np.any(DataCenter.properCrossings(px, py, dx, dy, others) < 1):
+                            continue #p does not see q
+                        tHigh = np.min(DataCenter.properCrossings(qx, qy, dx, dy, np.delete(segs, k, axis=0)), initial=math.inf)
+                        (tLow, tHigh) = DataCenter.clipToHalfPlane(qx, qy, dx, dy, 0.0, tHigh, halfPlane)
+                        clipped = DataCenter.clipLine(qx, qy, dx, dy, tLow, tHigh, rect)
+                        if clipped != None:
+                            critical.append(clipped)
+        return critical
+        
+    @staticmethod
+    def properCrossings(ax, ay, dx, dy, segs):
+        #for each segment crossed by the ray from (ax, ay) in direction (dx, dy) strictly inside both, the
+        #ray parameter of the crossing; inf for the others
+        (sx, sy) = (segs[:, 2] - segs[:, 0], segs[:, 3] - segs[:, 1])
+        denominator = dx*sy - dy*sx
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = ((segs[:, 0] - ax)*sy - (segs[:, 1] - ay)*sx) / denominator
+            u = ((segs[:, 0] - ax)*dy - (segs[:, 1] - ay)*dx) / denominator
+        return np.where((denominator != 0) & (t > 0) & (u > 0) & (u < 1), t, math.inf)
+        
+    @staticmethod
+    def clipToHalfPlane(ax, ay, dx, dy, tLow, tHigh, halfPlane):
+        #parameter range of the ray a + t*d, t in [tLow, tHigh], with nx*x + ny*y > c for halfPlane = (nx, ny, c)
+        if halfPlane == None:
+            return (tLow, tHigh)
+        (nx, ny, c) = halfPlane
+        rate = nx*dx + ny*dy
+        start = nx*ax + ny*ay - c
+        if rate > 0:
+            tLow = max(tLow, -start/rate)
+        elif rate < 0:
+            tHigh = min(tHigh, -start/rate)
+        elif start <= 0:
+            return (tHigh, tLow)
+        return (tLow, tHigh)
+        
+    @staticmethod
+    def clipLine(ax, ay, dx, dy, tLow, tHigh, rect):
+        #the part of a + t*d, t in [tLow, tHigh], inside rect as (x1, y1, x2, y2), or None if it is shorter than a point
+        for (start, rate, low, high) in ((ax, dx, rect.left, rect.right), (ay, dy, rect.top, rect.bottom)):
+            if rate == 0:
+                if start < low or start > high:
+                    return None
+                continue
+            (t1, t2) = sorted(((low - start)/rate, (high - start)/rate))
+            tLow = max(tLow, t1)
+            tHigh = min(tHigh, t2)
+        if tHigh <= tLow:
+            return None
+        return (ax + tLow*dx, ay + tLow*dy, ax + tHigh*dx, ay + tHigh*dy)
+        
+    def guardingHalfPlane(self, rack):
+        #The guarding side rule, defined here only: a guard at (x, y) may guard rack only if nx*x + ny*y > c
+        #for (nx, ny, c) = guardingHalfPlane(rack), and anywhere if it is None.  The coefficients are 0 and
+        #+-1, so the test is exact in floating point
+        if self.guardingModel == DataCenter.POSERS_CHOICE:
+            if rack.dir == Rack.RIGHT:
+                return (1.0, 0.0, rack.seg.x1)
+            elif rack.dir == Rack.LEFT:
+                return (-1.0, 0.0, -rack.seg.x1)
+            elif rack.dir == Rack.DOWN:
+                return (0.0, -1.0, -rack.seg.y1)
+            elif rack.dir == Rack.UP:
+                return (0.0, 1.0, rack.seg.y1)
+        return None
+        
+    def generateArrangementCandidates(self):
+        #Alternative to grid.generateCandidateGuardSet(): one candidate inside every face of the arrangement
+        #of criticalSegments(), so no grid refinement is needed.  Returns the number of candidates
+        critical = self.criticalSegments()
+        (xs, ys) = arrangementFacePoints(critical, self.boundaryRect)
+        numCandidates = self.grid.generateArrangementCandidateSet(xs, ys)
+        logging.info("Critical line arrangement: " + str(len(critical)) + " segments, " + str(numCandidates) + " faces")
+        return numCandidates
+        
+    def computeVisibleRacks(self, guard_indices):
+        #generates, for each of the given candidate guards in turn, the tuple of the racks it can see
+        if self.numVisibilityWorkers > 1 and len(guard_indices) > DataCenter.PARALLEL_MIN_CANDIDATES:
+            yield from self.computeVisibleRacksInParallel(guard_indices)
+            return
+        if self.visibilityEngine == DataCenter.VISIBILITY_VECTORIZED:
+            yield from self.computeVisibleRacksVectorized(guard_indices)
+            return
+        if self.visibilityEngine == DataCenter.VISIBILITY_REGIONS and self.coverage == DataCenter.COMPLETE_COVERAGE:
+            yield from self.computeVisibleRacksByRegions(guard_indices)
+            return
+        
+        for j in guard_indices:
+            yield tuple(i for i in range(len(self.racks)) if self.guardCanSeeRack(j, i))
+            
+    def computeVisibleRacksInParallel(self, guard_indices):
+        #Shards the guards into blocks that a process pool runs through the selected engine.  The racks
+        #and guarding semantics go to each worker once, through the pool initializer; tasks only carry
+        #guard locations.  Results come back in submission order, so the output is deterministic
+        blockSize = max(1, math.ceil(len(guard_indices)/(DataCenter.PARALLEL_TASKS_PER_WORKER*self.numVisibilityWorkers)))
+        locationBlocks = []
+        for start in range(0, len(guard_indices), blockSize):
+            block = np.array(list(guard_indices[start:start + blockSize]), dtype=np.int64)
+            locationBlocks.append((self.grid.candidateXs[block], self.grid.candidateYs[block]))
+        
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.numVisibilityWorkers, initializer=initVisibilityWorker,
+                                                    initargs=(self.visibilityWorkerCopy(),)) as executor:
+            for blockRacks in executor.map(computeVisibleRacksInWorker, locationBlocks):
+                yield from blockRacks
+                
+    def visibilityWorkerCopy(self):
+        #just the racks and the guarding semantics, which is all a visibility worker needs
+        dataCenter = DataCenter(self.boundaryRect, self.epsilon)
+        dataCenter.racks = self.racks
+        dataCenter.guardingModel = self.guardingModel
+        dataCenter.coverage = self.coverage
+        dataCenter.delta = self.delta
+        dataCenter.visibilityEngine = self.visibilityEngine
+        return dataCenter
+            
+    def computeVisibleRacksVectorized(self, guard_indices):
+        #Same result as the guardCanSeeRack loop, but keeps guard locations and rack endpoints in
+        #numpy arrays and tests a whole block of guards against all occluders at once
+        numRacks = len(self.racks)
+        guardIndices = np.array(list(guard_indices), dtype=np.int64)
+        guards = PointArray(self.grid.candidateXs[guardIndices], self.grid.candidateYs[guardIndices])
+        rackSegs = SegmentArray.FromSegments([rack.seg for rack in self.racks])
+        
+        for start in range(0, len(guard_indices), DataCenter.VECTORIZED_BLOCK_SIZE):
+            stop = min(start + DataCenter.VECTORIZED_BLOCK_SIZE, len(guard_indices))
+            block = guards[start:stop]
+            blockMatrix = np.zeros((stop - start, numRacks), dtype=bool)
+            for i in range(numRacks):
+                blockMatrix[:, i] = self.rackVisibilityForGuardBlock(i, block, rackSegs)
+            blockRacks = [[] for k in range(stop - start)]
+            (guardHits, rackHits) = np.nonzero(blockMatrix)
+            for (k, i) in zip(guardHits.tolist(), rackHits.tolist()):
+                blockRacks[k].append(i)
+            for racks in blockRacks:
+                yield tuple(racks)
+        
+    def getVisibilityRegion(self, rack_index): #built once, then reused for every grid refinement
+        if rack_index not in self.visibilityRegions:
+            self.visibilityRegions[rack_index] = RackVisibilityRegion(self.racks, rack_index)
+        return self.visibilityRegions[rack_index]
+        
+    def computeVisibleRacksByRegions(self, guard_indices):
+        #Classifies blocks of candidate guards against each rack's visibility region clauses (every guard
+        #against every nearby occluder, no point-in-polygon shortcut); the few candidates on a region
+        #boundary get the exact guardCanSeeRack test
+        numRacks = len(self.racks)
+        guardIndices = np.array(list(guard_indices), dtype=np.int64)
+        guardXs = self.grid.candidateXs[guardIndices]
+        guardYs = self.grid.candidateYs[guardIndices]
+        
+        for start in range(0, len(guard_indices), DataCenter.VECTORIZED_BLOCK_SIZE):
+            stop = min(start + DataCenter.VECTORIZED_BLOCK_SIZE, len(guard_indices))
+            gx = guardXs[start:stop]
+            gy = guardYs[start:stop]
+            blockMatrix = np.zeros((stop - start, numRacks), dtype=bool)
+            for i in range(numRacks):
+                rows = np.flatnonzero(self.guardingSideMask(self.racks[i], gx, gy))
+                if len(rows) == 0:
+                    continue
+                (inside, onBoundary) = self.getVisibilityRegion(i).classify(gx[rows], gy[rows])
+                blockMatrix[rows, i] = inside & ~onBoundary
+                for k in rows[onBoundary].tolist():
+                    blockMatrix[k, i] = self.guardCanSeeRack(guard_indices[start + k], i)
+            blockRacks = [[] for k in range(stop - start)]
+            (guardHits, rackHits) = np.nonzero(blockMatrix)
+            for (k, i) in zip(guardHits.tolist(), rackHits.tolist()):
+                blockRacks[k].append(i)
+            for racks in blockRacks:
+                yield tuple(racks)
+        
+    def rackVisibilityForGuardBlock(self, rack_index, guards, rackSegs):
+        #boolean array telling which of the guards (a PointArray) can see rack rack_index (all of it, or all
+        #but delta of it with ALL_BUT_DELTA_COVERAGE); rackSegs is the SegmentArray of all the racks
+        rack = self.racks[rack_index]
+        seg = rack.seg
+        canSee = self.guardingSideMask(rack, guards.xs, guards.ys)
+        if not canSee.any():
+            return canSee
+        
+        if self.coverage == DataCenter.ALL_BUT_DELTA_COVERAGE:
+            occluders = rackSegs[self.potentialOccluders(rack_index, min(guards.xs.min(), seg.x1, seg.x2), min(guards.ys.min(), seg.y1, seg.y2),
+                                                         max(guards.xs.max(), seg.x1, seg.x2), max(guards.ys.max(), seg.y1, seg.y2))]
+            return canSee & (self.hiddenLengthsForGuardBlock(seg, guards, occluders) <= self.delta)
+        
+        rackEnds = SegmentArray(seg.x1, seg.y1, seg.x2, seg.y2)
+        if (rackEnds.orientation(guards) == 0).any():
+            occluders = rackSegs[np.arange(len(rackSegs)) != rack_index]  #degenerate triangles, see triangleOccluders
+        else:
+            occluders = rackSegs[self.potentialOccluders(rack_index, min(guards.xs.min(), seg.x1, seg.x2), min(guards.ys.min(), seg.y1, seg.y2),
+                                                         max(guards.xs.max(), seg.x1, seg.x2), max(guards.ys.max(), seg.y1, seg.y2))]
+        blocked = occluders.intersectsTriangles(guards.column(), rackEnds.startPoints(), rackEnds.endPoints())
+        return canSee & ~blocked.any(axis=1)
+        
+    def isOnGuardingSide(self, loc, rack):
+        #the wrong side test of guardCanSeeRack: False if the guarding model forbids guarding rack from loc
+        halfPlane = self.guardingHalfPlane(rack)
+        if halfPlane == None:
+            return True
+        (nx, ny, c) = halfPlane
+        return nx*loc.x + ny*loc.y > c
+        
+    @staticmethod
+    def hiddenLengthsForGuardBlock(seg, guards, occluders):
+        #hiddenLengthOfRack for a block of guards (a PointArray), with the same interval arithmetic done on
+        #(guards, occluders) arrays; occluders is a SegmentArray
+        (gx, gy) = (guards.xs, guards.ys)
+        ux = seg.x2 - seg.x1
+        uy = seg.y2 - seg.y1
+        lengthSq = ux*ux + uy*uy
+        if lengthSq == 0:
+            return np.zeros(gx.shape)
+        guardHeight = ux*(gy - seg.y1) - uy*(gx - seg.x1)
+        (ox1, oy1, ox2, oy2) = (occluders.x1s, occluders.y1s, occluders.x2s, occluders.y2s)
+        
+        with np.errstate(divide="ignore", invalid="ignore"):
+            height = guardHeight[:, None]
+            h1 = (ux*(oy1 - seg.y1) - uy*(ox1 - seg.x1)) / height
+            h2 = (ux*(oy2 - seg.y1) - uy*(ox2 - seg.x1)) / height
+            dh = h2 - h1
+            flat = (dh == 0)
+            lo = np.where(flat, 0.0, np.maximum(0.0, np.minimum(-h1/dh, (1 - h1)/dh)))
+            hi = np.where(flat, 1.0, np.minimum(1.0, np.maximum(-h1/dh, (1 - h1)/dh)))
+            valid = np.where(flat, (h1 >= 0) & (h1 <= 1), lo <= hi)
+            
+            guardParam = ((ux*(gx - seg.x1) + uy*(gy - seg.y1)) / lengthSq)[:, None]
+            params = []
+            onOccluder = np.zeros(h1.shape, dtype=bool)
+            for lam in (lo, hi):
+                dx = ox1 + lam*(ox2 - ox1) - gx[:, None]
+                dy = oy1 + lam*(oy2 - oy1) - gy[:, None]
+                along = ux*dx + uy*dy
+                depth = (1 - np.clip(h1 + lam*dh, 0.0, 1.0)) * lengthSq
+                onOccluder |= valid & (depth == 0) & (along == 0)
+                params.append(np.where(depth == 0, np.copysign(np.inf, along), guardParam + along/depth))
+            lo = np.minimum(1.0, np.maximum(0.0, np.minimum(params[0], params[1])))
+            hi = np.minimum(1.0, np.maximum(0.0, np.maximum(params[0], params[1])))
+            
+        valid &= (hi > lo) | onOccluder
+        lo = np.where(onOccluder, 0.0, np.where(valid, lo, 0.0))
+        hi = np.where(onOccluder, 1.0, np.where(valid, hi, 0.0))
+        
+        order = np.argsort(lo, axis=1, kind="stable")
+        lo = np.take_along_axis(lo, order, axis=1)
+        hi = np.take_along_axis(hi, order, axis=1)
+        reach = np.maximum.accumulate(hi, axis=1)
+        previousReach = np.concatenate([np.zeros((len(gx), 1)), reach[:, :-1]], axis=1)
+        hidden = np.maximum(0.0, hi - np.maximum(lo, previousReach)).sum(axis=1) * math.sqrt(lengthSq)
+        return np.where(guardHeight == 0, math.sqrt(lengthSq), hidden)
+        
+    def guardingSideMask(self, rack, gx, gy):
+        #vectorized isOnGuardingSide
+        halfPlane = self.guardingHalfPlane(rack)
+        if halfPlane == None:
+            return np.ones(gx.shape, dtype=bool)
+        (nx, ny, c) = halfPlane
+        return nx*gx + ny*gy > c
                 
-    def findMinimalGuardSet(self):
+    def reduceCandidates(self):
+        #Merges candidates with identical guarding-matrix columns and drops those whose racks are a
+        #subset of another candidate's.  findMinimalGuardSet then solves over the kept ones only
+        (self.grid.reducedColumns, self.grid.reducedRackSets) = reduceColumns(self.grid.rackGuardSets, self.grid.numCandidates())
+        return len(self.grid.reducedColumns)
+        
+    def getCoverInstance(self):
+        #(columns, rackSets): the set cover instance to solve.  columns[k] is the candidate guard index of
+        #the kth variable and rackSets[i] lists the variables that see rack i
+        if self.grid.reducedColumns != None:
+            return (self.grid.reducedColumns, self.grid.reducedRackSets)
+        return (list(range(self.grid.numCandidates())), self.grid.rackGuardSets)
+        
+    def startingColumns(self, guards, columns, rackSets):
+        #variables of the cover instance standing in for the given guards (e.g. the ones selected at a
+        #coarser grid level), or None if they are no longer candidates or do not cover every rack
+        position = {}
+        for k in range(len(columns)):
+            position[columns[k]] = k
+        start = set()
+        candidates = self.grid.candidateIndices([guard.loc.x for guard in guards], [guard.loc.y for guard in guards])
+        if (candidates < 0).any():
+            return None
+        for j in candidates.tolist():
+            if j in position:
+                start.add(position[j])
+                continue
+            racks = self.grid.visibleRacks[j]
+            if len(racks) == 0:
+                continue
+            covering = set(rackSets[racks[0]]) #a kept column seeing all the racks this reduced-away guard sees
+            for i in racks[1:]:
+                covering.intersection_update(rackSets[i])
+            if len(covering) == 0:
+                return None
+            start.add(min(covering))
+        for i in range(len(self.racks)):
+            if start.isdisjoint(rackSets[i]):
+                return None
+        return sorted(start)
+        
+    def findMinimalGuardSet(self, previousGuards=None):
+        #previousGuards: a guard set found earlier, e.g. at the previous refinement level.  If it is still
+        #a cover of the candidates it is passed to the solver as a starting solution and its size bounds the objective
+        self.grid.clearSelection() #candidates may be retained from an earlier solve
+            
+        self.guardLowerBound = None
+        if self.solveMode == DataCenter.SOLVE_INCREMENTAL_MIP:
+            result = self.solveCoverIncrementally()
+            if result == None:
+                return None
+            (selected, self.guardLowerBound) = result
+            self.grid.selectCandidates(selected)
+            logging.info("Solution cost: " + str(len(selected)) + " (lower bound " + str(self.guardLowerBound) + ") found from "
+                         + str(len(self.coverModelColumns)) + " columns of the incremental model")
+            return len(selected)
+            
+        (columns, rackSets) = self.getCoverInstance()
+        presolve = presolveCover(rackSets, len(columns)) #forced guards and dominated racks/guards are taken out before the MIP
+        if presolve.infeasible:
+            return None
+        
+        solution = []
+        lowerBound = 0
+        if len(presolve.racks) > 0:
+            if self.solveMode == DataCenter.SOLVE_HEURISTIC:
+                result = self.solveCoverHeuristically(presolve)
+            elif self.solveMode == DataCenter.SOLVE_COLUMN_GENERATION:
+                result = self.solveCoverByColumnGeneration(presolve)
+            else:
+                result = None
+                if self.solveMode == DataCenter.SOLVE_BRANCH_AND_BOUND or (self.solveMode == DataCenter.SOLVE_AUTO and len(presolve.racks) <= DataCenter.EXACT_SOLVER_MAX_RACKS):
+                    solution = exactSetCover(presolve.rackSets, len(presolve.columns), DataCenter.EXACT_SOLVER_MAX_NODES)
+                    if solution != None:
+                        result = (solution, len(solution))
+                if result == None:
+                    result = self.solveCoverByMIP(presolve, columns, rackSets, previousGuards)
+            if result == None: #the solver gave up without any cover, fall back to the heuristic one
+                logging.info("No solution from the solver, using the heuristic cover")
+                result = self.solveCoverHeuristically(presolve)
+            (solution, lowerBound) = result
+        
+        self.guardLowerBound = len(presolve.forced) + lowerBound
+        selected = [columns[k] for k in presolve.solution(solution)]
+        self.grid.selectCandidates(selected)
+        numGuards = len(selected)
+        if numGuards == self.guardLowerBound:
+            logging.info("Optimal solution cost: " + str(numGuards) + " found from " + str(len(columns)) + " candidates")
+        else:
+            logging.info("Solution cost: " + str(numGuards) + " (lower bound " + str(self.guardLowerBound) + ") found from " + str(len(columns)) + " candidates")
+        return numGuards  
+        
+    def refineUntilConverged(self, stableRounds=1, lowerBound=None, useWitnessBound=False, timeBudget=None, maxCandidates=None, maxIterations=None, callback=None):
+        """Alternate solving and refining the grid until the number of guards settles.
+        
+        Every iteration generates the candidates of the current grid, finds a minimal guard set
+        (starting from the previous iteration's) and then refines the grid, adaptively with
+        REFINE_ADAPTIVE.  The loop stops after an iteration in which
+          - the number of guards is the same as in each of the stableRounds iterations before (rounds
+            without any cover, e.g. a grid too coarse to see some rack, never count as converged),
+          - the number of guards reaches lowerBound, so no finer grid helps (with useWitnessBound and no
+            lowerBound given, witnessLowerBound() is used; it builds the full arrangement, O(R^3)),
+          - maxIterations iterations have been run,
+        or, after refining, if the next iteration would exceed maxCandidates candidates or, going by
+        the time of the last one scaled by the growth of the grid, end more than timeBudget seconds
+        after the start.  The guards of the last iteration stay selected.
+        Returns the history, one dict per iteration with keys iteration, numCandidates, numGuards,
+        guardLowerBound (for that iteration's candidates) and seconds; callback(entry) is called as each
+        one is done.  refinementStopReason is set to the STOP_ constant for the condition that was met.
+        """
+        start = time.time()
+        if lowerBound == None and useWitnessBound:
+            lowerBound = self.witnessLowerBound()
+            logging.info("Lower bound for any guard set: " + str(lowerBound))
+        history = []
+        previousGuards = None
+        self.refinementStopReason = None
+        while self.refinementStopReason == None:
+            iterationStart = time.time()
+            numCandidates = self.grid.generateCandidateGuardSet()
+            self.generateGuardingMatrix()
+            self.reduceCandidates()
+            numGuards = self.findMinimalGuardSet(previousGuards)
+            previousGuards = self.getSelectedGuards()
+            entry = {"iteration": len(history), "numCandidates": numCandidates, "numGuards": numGuards,
+                     "guardLowerBound": self.guardLowerBound, "seconds": time.time() - iterationStart}
+            history.append(entry)
+            if callback != None:
+                callback(entry)
+            
+            recent = [e["numGuards"] for e in history[-(stableRounds + 1):]]
+            if numGuards != None and lowerBound != None and numGuards <= lowerBound:
+                self.refinementStopReason = DataCenter.STOP_LOWER_BOUND
+            elif numGuards != None and len(recent) == stableRounds + 1 and len(set(recent)) == 1:
+                self.refinementStopReason = DataCenter.STOP_UNCHANGED
+            elif maxIterations != None and len(history) >= maxIterations:
+                self.refinementStopReason = DataCenter.STOP_MAX_ITERATIONS
+            else:
+                numCells = len(self.grid.cells)
+                if self.grid.refinement == DataCenterGrid.REFINE_ADAPTIVE:
+                    numSplit = self.refineGridAdaptively()
+                else:
+                    numSplit = self.grid.refineGrid()
+                newNumCells = len(self.grid.getCells())
+                if self.grid.retainCandidates:
+                    numNextCandidates = numCandidates + newNumCells #at most
+                else:
+                    numNextCandidates = newNumCells
+                if numSplit == 0:
+                    self.refinementStopReason = DataCenter.STOP_UNCHANGED
+                elif maxCandidates != None and numNextCandidates > maxCandidates:
+                    self.refinementStopReason = DataCenter.STOP_CANDIDATE_BUDGET
+                elif timeBudget != None and time.time() - start + entry["seconds"]*newNumCells/max(numCells, 1) > timeBudget:
+                    self.refinementStopReason = DataCenter.STOP_TIME_BUDGET
+        logging.info("Refinement stopped after " + str(len(history)) + " iterations (" + self.stopReasonToString() + ") with "
+                     + str(history[-1]["numGuards"]) + " guards in " + str(round(time.time() - start, 2)) + " seconds")
+        return history
+        
+    def stopReasonToString(self):
+        if self.refinementStopReason == DataCenter.STOP_UNCHANGED:
+            return "unchanged"
+        elif self.refinementStopReason == DataCenter.STOP_LOWER_BOUND:
+            return "lower bound reached"
+        elif self.refinementStopReason == DataCenter.STOP_TIME_BUDGET:
+            return "time budget"
+        elif self.refinementStopReason == DataCenter.STOP_CANDIDATE_BUDGET:
+            return "candidate budget"
+        elif self.refinementStopReason == DataCenter.STOP_MAX_ITERATIONS:
+            return "iteration limit"
+        return "not stopped"
+        
+    def witnessLowerBound(self):
+        #lower bound on the number of guards anywhere in boundaryRect, not just at grid candidates: racks no
+        #single location sees two of need a guard each (setCover.disjointRacksBound).  Which racks are seen
+        #together is read off one location per face of criticalSegments(), so this needs COMPLETE_COVERAGE.
+        #None otherwise or if some rack cannot be guarded at all
+        if self.coverage != DataCenter.COMPLETE_COVERAGE:
+            return None
+        (xs, ys) = arrangementFacePoints(self.criticalSegments(), self.boundaryRect)
+        visibleSets = set(frozenset(racks) for racks in self.visibleRacksAtLocations(xs, ys))
+        rackSets = [[] for i in range(len(self.racks))]
+        k = 0
+        for racks in visibleSets:
+            for i in racks:
+                rackSets[i].append(k)
+            k += 1
+        if any(len(s) == 0 for s in rackSets):
+            return None
+        return disjointRacksBound(rackSets)
+        
+    def improvingGuardSets(self, timeBudget, previousGuards=None):
+        #Anytime counterpart of findMinimalGuardSet: a generator yielding (numGuards, lowerBound, gap) every time a
+        #better guard set or a better bound is found, with the selected flags set to the best guard set so far and
+        #gap = (numGuards - lowerBound) / numGuards.  The first one is the heuristic cover (or the previous guards,
+        #if smaller), after that CBC runs in doubling time slices warm started from the best cover until it is
+        #proven optimal or timeBudget seconds are up.  Yields nothing if some rack cannot be guarded
+        startTime = time.time()
+        self.guardLowerBound = None
+        (columns, rackSets) = self.getCoverInstance()
+        presolve = presolveCover(rackSets, len(columns))
+        if presolve.infeasible:
+            return
+        
+        def selectGuards(solution, lowerBound):
+            self.grid.clearSelection()
+            self.grid.selectCandidates(columns[k] for k in presolve.solution(solution))
+            numGuards = len(presolve.forced) + len(solution)
+            self.guardLowerBound = len(presolve.forced) + lowerBound
+            logging.info("Incumbent: " + str(numGuards) + " guards, lower bound " + str(self.guardLowerBound) + " after "
+                         + str(round(time.time() - startTime, 3)) + " seconds")
+            return (numGuards, self.guardLowerBound, (numGuards - self.guardLowerBound) / max(numGuards, 1))
+        
+        if len(presolve.racks) == 0:
+            yield selectGuards([], 0)
+            return
+        (solution, lowerBound) = self.solveCoverHeuristically(presolve)
+        if previousGuards:
+            start = self.startingColumns(previousGuards, columns, rackSets)
+            if start != None:
+                start = presolve.reducedCover(set(start))
+            if start != None and len(start) < len(solution):
+                solution = start
+        yield selectGuards(solution, lowerBound)
+        
+        model = Model(sense=MINIMIZE)
+        model.verbose = 0
+        G = [model.add_var(var_type=BINARY, obj=1) for k in range(len(presolve.columns))]
+        for k in range(len(presolve.racks)):
+            model += xsum(G[l] for l in presolve.rackSets[k]) >= 1
+        sliceSeconds = DataCenter.ANYTIME_FIRST_SLICE
+        while len(solution) > lowerBound:
+            remaining = timeBudget - (time.time() - startTime)
+            if remaining <= 0:
+                break
+            model.start = [(G[k], 1.0) for k in solution]
+            status = model.optimize(max_seconds=min(sliceSeconds, remaining))
+            if status != OptimizationStatus.OPTIMAL and status != OptimizationStatus.FEASIBLE:
+                if status == OptimizationStatus.INFEASIBLE or status == OptimizationStatus.INT_INFEASIBLE:
+                    break
+                sliceSeconds *= 2
+                continue
+            improved = False
+            found = [k for k in range(len(presolve.columns)) if G[k].x >= 0.99]
+            if len(found) < len(solution):
+                solution = found
+                improved = True
+            bound = len(found) if status == OptimizationStatus.OPTIMAL else math.ceil(model.objective_bound - 1e-6)
+            if bound > lowerBound:
+                lowerBound = min(bound, len(solution))
+                improved = True
+            if improved:
+                yield selectGuards(solution, lowerBound)
+            sliceSeconds *= 2
+        
+    def findGuardSetAnytime(self, timeBudget, callback=None, previousGuards=None):
+        #runs improvingGuardSets, calling callback(numGuards, lowerBound, gap) for each improvement, and returns the
+        #number of guards of the best guard set found (which is left selected), None if some rack cannot be guarded
+        numGuards = None
+        for (numGuards, lowerBound, gap) in self.improvingGuardSets(timeBudget, previousGuards):
+            if callback != None:
+                callback(numGuards, lowerBound, gap)
+        return numGuards
+        
+    def solveCoverByMIP(self, presolve, columns, rackSets, previousGuards):
+        #(solution, lowerBound) for the presolved instance, solution given as positions in presolve.columns.
+        #If CBC stops at the time limit its best solution is kept, or else the warm start; None if there is neither
         model = Model(sense=MINIMIZE)
 
-        G = [model.add_var(var_type=BINARY) for i in range(len(self.grid.candidateGuardSet))]
+        G = [model.add_var(var_type=BINARY) for k in range(len(presolve.columns))]
             
-        for i in range(len(self.racks)): 
-            model += xsum(self.grid.guardingMatrix[i][j]*G[j] for j in range(len(self.grid.candidateGuardSet))) >= 1
+        for k in range(len(presolve.racks)): 
+            model += xsum(G[l] for l in presolve.rackSets[k]) >= 1
         
-        model.objective = minimize(xsum(G[i]  for i in range(len(self.grid.candidateGuardSet))))
+        model.objective = minimize(xsum(G[k] for k in range(len(presolve.columns))))
+        
+        start = None
+        if previousGuards:
+            start = self.startingColumns(previousGuards, columns, rackSets)
+            if start != None:
+                start = presolve.reducedCover(set(start))
+            if start != None:
+                logging.info("Warm start: previously selected guards give a cover of size " + str(len(presolve.forced) + len(start)))
+                model.start = [(G[k], 1.0) for k in start]
+                model.cutoff = len(start) + 0.5 #integer objective, so this only admits solutions at least as good
         
         #self.grid.selectedGuards = []
         model.max_mip_gap = 0.05
         status = model.optimize(max_seconds=60)
-        if status == OptimizationStatus.OPTIMAL:
-            logging.info("Optimal solution cost: " + str(int(model.objective_value)) + " found from " + str(len(self.grid.candidateGuardSet)) + " candidates")
-            iter = 0
-            numGuards = 0
+        if status == OptimizationStatus.OPTIMAL or status == OptimizationStatus.FEASIBLE:
             for v in model.vars:
                 logging.debug('{} : {}'.format(v.name, v.x))
-                if v.x == 1:
-                    self.grid.candidateGuardSet[iter].selected = True  
-                    numGuards += 1                  
-                    #self.grid.selectedGuards.append(iter)
-                iter += 1
-            return numGuards  
-        
-    def howMuchCanFixedNumberOffGauardsSee(self, numGuards):
-        #not yet implemented
-        return 0 #returns the maximum fractional amount seen by given number of guards
+            solution = [k for k in range(len(presolve.columns)) if G[k].x >= 0.99]
+            return (solution, math.ceil(model.objective_bound - 1e-6))
+        if start != None:
+            logging.info("MIP status " + str(status) + ", keeping the warm start")
+            return (start, disjointRacksBound(presolve.rackSets))
+        return None
+        
+    def solveCoverIncrementally(self):
+        #(selected candidate guards, lowerBound) from the persistent model, None if CBC finds no cover at all.
+        #The model keeps one cover row per rack; candidates appended to the grid since the last call (with
+        #retainCandidates nothing is ever removed) become new binary columns in those rows, unless an existing
+        #column already sees all their racks.  Whenever the grid has replaced its candidates since (always without
+        #retainCandidates, or after generateArrangementCandidates) the model is rebuilt
+        numCandidates = self.grid.numCandidates()
+        if self.coverModel == None or self.coverModelGeneration != self.grid.candidateGeneration:
+            self.resetCoverModel()
+            self.coverModelMasksByRack = [[] for i in range(len(self.racks))]
+            self.coverModelGeneration = self.grid.candidateGeneration
+        
+        newColumns = []
+        for j in range(self.coverModelNumCandidates, numCandidates):
+            racks = self.grid.visibleRacks[j]
+            mask = 0
+            for i in racks:
+                mask |= 1 << i
+            if mask != 0:
+                newColumns.append((len(racks), mask, j, racks))
+        newColumns.sort(key=lambda column: (-column[0], column[2])) #columns seeing more racks first, so they are in place to dominate
+        added = []
+        for (size, mask, j, racks) in newColumns:
+            if mask in self.coverModelMasks:
+                continue
+            rarest = min(racks, key=lambda i: len(self.coverModelMasksByRack[i]))
+            if any(mask & ~other == 0 for other in self.coverModelMasksByRack[rarest]):
+                continue
+            added.append((j, racks))
+            self.coverModelMasks.add(mask)
+            for i in racks:
+                self.coverModelMasksByRack[i].append(mask)
+        numAdded = len(added)
+        if self.coverModel == None:
+            if len(added) == 0:
+                return None #no candidate sees any rack (the model cannot have rows without variables)
+            self.coverModel = Model(sense=MINIMIZE)
+            G = [self.coverModel.add_var(var_type=BINARY, obj=1) for k in range(len(added))]
+            rackColumns = [[] for i in range(len(self.racks))]
+            for k in range(len(added)):
+                for i in added[k][1]:
+                    rackColumns[i].append(G[k])
+            self.coverModelRows = [self.coverModel.add_constr(xsum(rackColumns[i]) >= 1) for i in range(len(self.racks))]
+        else:
+            for (j, racks) in added:
+                self.coverModel.add_var(var_type=BINARY, obj=1, column=Column([self.coverModelRows[i] for i in racks], [1.0] * len(racks)))
+        self.coverModelColumns.extend(j for (j, racks) in added)
+        logging.info("Incremental cover model: " + str(numAdded) + " columns added for " + str(numCandidates - self.coverModelNumCandidates)
+                     + " new candidates")
+        self.coverModelNumCandidates = numCandidates
+        
+        if any(len(masks) == 0 for masks in self.coverModelMasksByRack):
+            return None #some rack is not seen by any candidate yet
+        model = self.coverModel
+        if len(self.coverModelSolution) > 0: #still a cover, columns are only ever added
+            model.start = [(model.vars[k], 1.0) for k in self.coverModelSolution]
+            model.cutoff = len(self.coverModelSolution) + 0.5
+        model.max_mip_gap = 0.05
+        status = model.optimize(max_seconds=60)
+        if status == OptimizationStatus.OPTIMAL or status == OptimizationStatus.FEASIBLE:
+            self.coverModelSolution = [k for k in range(len(self.coverModelColumns)) if model.vars[k].x >= 0.99]
+            lowerBound = math.ceil(model.objective_bound - 1e-6)
+        elif len(self.coverModelSolution) > 0: #nothing better within the time limit, keep the previous cover
+            lowerBound = 0
+        else:
+            return None
+        return ([self.coverModelColumns[k] for k in self.coverModelSolution], lowerBound)
+        
+    def solveCoverByColumnGeneration(self, presolve):
+        #(solution, lowerBound) for the presolved instance.  The LP relaxation starts from one guard per rack
+        #and each round adds the (at most COLUMN_GENERATION_BATCH) guards with negative reduced cost under
+        #its duals.  Once none is left the LP is optimal over all guards, which gives the bound, and the
+        #integer program is solved over the guards generated so far.  None if CBC finds no cover
+        numColumns = len(presolve.columns)
+        columnRacks = columnRackLists(presolve.rackSets, numColumns)
+        incidenceColumns = np.array([l for l in range(numColumns) for k in columnRacks[l]], dtype=np.int64)
+        incidenceRacks = np.array([k for l in range(numColumns) for k in columnRacks[l]], dtype=np.int64)
+        
+        model = Model(sense=MINIMIZE)
+        model.verbose = 0
+        G = {} #position in presolve.columns -> variable, for the generated guards
+        for k in range(len(presolve.racks)):
+            l = presolve.rackSets[k][0]
+            if l not in G:
+                G[l] = model.add_var(var_type=BINARY, obj=1)
+        rackConstrs = [model.add_constr(xsum(G[l] for l in presolve.rackSets[k] if l in G) >= 1) for k in range(len(presolve.racks))]
+        
+        rounds = 0
+        while True:
+            if model.optimize(relax=True) != OptimizationStatus.OPTIMAL:
+                return None
+            rounds += 1
+            pi = np.array([constr.pi for constr in rackConstrs])
+            reducedCosts = 1.0 - np.bincount(incidenceColumns, weights=pi[incidenceRacks], minlength=numColumns)
+            reducedCosts[list(G)] = 0.0
+            priced = np.nonzero(reducedCosts < -1e-9)[0]
+            if len(priced) == 0:
+                break
+            priced = priced[np.argsort(reducedCosts[priced], kind="stable")[:DataCenter.COLUMN_GENERATION_BATCH]]
+            for l in priced.tolist():
+                G[l] = model.add_var(var_type=BINARY, obj=1, column=Column([rackConstrs[k] for k in columnRacks[l]], [1.0] * len(columnRacks[l])))
+        
+        lowerBound = math.ceil(model.objective_value - 1e-6)
+        logging.info("Column generation: LP value " + str(model.objective_value) + " after " + str(rounds) + " rounds with "
+                     + str(len(G)) + " of " + str(numColumns) + " guards")
+        model.max_mip_gap = 0.05
+        status = model.optimize(max_seconds=60)
+        if status != OptimizationStatus.OPTIMAL and status != OptimizationStatus.FEASIBLE:
+            return None
+        solution = sorted(l for l in G if G[l].x >= 0.99)
+        return (solution, lowerBound)
+        
+    def solveCoverHeuristically(self, presolve):
+        #(solution, lowerBound) for the presolved instance without an optimality proof: the smaller of the
+        #greedy cover and (optionally) the rounded LP relaxation, each with redundant guards removed.  The
+        #bound is the rounded-up LP value, or the disjoint racks bound when the LP is not solved
+        numColumns = len(presolve.columns)
+        solution = removeRedundantColumns(presolve.rackSets, numColumns, greedySetCover(presolve.rackSets, numColumns))
+        lowerBound = disjointRacksBound(presolve.rackSets)
+        if self.heuristicLPRounding:
+            model = Model(sense=MINIMIZE)
+            model.verbose = 0
+            G = [model.add_var(lb=0.0, ub=1.0) for k in range(numColumns)]
+            for k in range(len(presolve.racks)):
+                model += xsum(G[l] for l in presolve.rackSets[k]) >= 1
+            model.objective = minimize(xsum(G))
+            if model.optimize(relax=True) == OptimizationStatus.OPTIMAL:
+                lowerBound = max(lowerBound, math.ceil(model.objective_value - 1e-6))
+                order = sorted(range(numColumns), key=lambda k: -G[k].x)
+                rounded = removeRedundantColumns(presolve.rackSets, numColumns, coverInOrder(presolve.rackSets, numColumns, order))
+                if len(rounded) < len(solution):
+                    solution = rounded
+        return (solution, lowerBound)
+        
+    def howMuchCanFixedNumberOffGauardsSee(self, numGuards, exact=False):
+        #returns the maximum fractional amount of rack length seen by given number of guards and marks
+        #them selected.  The lazy greedy answer is within (1 - 1/e) of the best; with exact=True it warm
+        #starts a MIP over the same guarding matrix, which can only improve on it
+        self.grid.clearSelection()
+        (columns, rackSets) = self.getCoverInstance()
+        lengths = [rack.seg.length() for rack in self.racks]
+        totalLength = sum(lengths)
+        if totalLength == 0:
+            return 0
+        
+        chosen = greedyMaxCoverage(rackSets, len(columns), lengths, numGuards)
+        chosenSet = set(chosen)
+        seen = [i for i in range(len(self.racks)) if chosenSet.intersection(rackSets[i])]
+        logging.info("Greedy: " + str(len(chosen)) + " guards see " + str(sum(lengths[i] for i in seen)) + " of " + str(totalLength))
+        
+        if exact:
+            model = Model(sense=MAXIMIZE)
+            G = [model.add_var(var_type=BINARY) for k in range(len(columns))]
+            R = [model.add_var(var_type=BINARY) for i in range(len(self.racks))] #1 if rack i is seen
+            for i in range(len(self.racks)):
+                model += R[i] <= xsum(G[k] for k in rackSets[i])
+            model += xsum(G) <= numGuards
+            model.objective = maximize(xsum(lengths[i]*R[i] for i in range(len(self.racks))))
+            model.start = [(G[k], 1.0) for k in chosen] + [(R[i], 1.0) for i in seen]
+            status = model.optimize(max_seconds=60)
+            if status == OptimizationStatus.OPTIMAL or status == OptimizationStatus.FEASIBLE:
+                logging.info("Exact max coverage " + str(model.objective_value) + " (bound " + str(model.objective_bound) + ")")
+                chosen = [k for k in range(len(columns)) if G[k].x >= 0.99]
+                chosenSet = set(chosen)
+                seen = [i for i in range(len(self.racks)) if chosenSet.intersection(rackSets[i])]
+        
+        self.grid.selectCandidates(columns[k] for k in chosen)
+        return sum(lengths[i] for i in seen) / totalLength
         
     def draw(self, tt, drawGrid=False, drawCandidateGuards=False):
         tt.width(3) 
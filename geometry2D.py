@@ -3,6 +3,8 @@ from sympy.geometry import *
 
 import math
 import logging
+import numpy as np
+from fractions import Fraction
 
 
 class Point:
@@ -23,6 +25,8 @@ class Point:
     rotate_about  -- rotate around another point
     """
     
+    __slots__ = ("x", "y")  #no per-instance dict: candidate guards and rack endpoints come by the million
+    
     UNDEFINED = Point(-999999,-999999)  #returned, e.g., when looking for the intersection of two 
     
     def __init__(self, x=0.0, y=0.0):
@@ -165,6 +169,8 @@ class Point:
         turtle.penup() 
         
 class Line:    
+    __slots__ = ("has_infinite_slope", "const_x", "slope", "y_intercept")
+    
     def __init__(self, pt, m, inf_slope=False):
         self.has_infinite_slope = inf_slope
         if inf_slope:
@@ -201,6 +207,7 @@ class Segment:
     CLOCKWISE = -2
     COUNTERCLOCKWISE = -3
     
+    __slots__ = ("x1", "y1", "x2", "y2")
     
     def __init__(self, pt1, pt2):
         """Initialize a segment from two points."""
@@ -291,36 +298,10 @@ class Segment:
         return btwny1 or btwny2
     
     def orientation(self, pt):
-        val = ((self.y2 - self.y1) * (pt.x - self.x2)) - ((self.x2 - self.x1) * (pt.y - self.y2))
-        if val > 0:
-            return Segment.CLOCKWISE
-        elif val < 0:
-            return Segment.COUNTERCLOCKWISE
-        else:
-            return Segment.COLINEAR
-            
+        return orientationFromCoordinates(self.x1, self.y1, self.x2, self.y2, pt.x, pt.y)
     
     def intersectsWithSegment(self, seg):
-        p1 = Point(self.x1, self.y1)
-        q1 = Point(self.x2, self.y2)
-        
-        p2 = Point(seg.x1, seg.y1)
-        q2 = Point(seg.x2, seg.y2)
-        
-        o1 = self.orientation(p2)
-        o2 = self.orientation(q2)
-        o3 = seg.orientation(p1)
-        o4 = seg.orientation(q1)
-        
-        if o1 != o2 and o3 != o4:
-            return True
-        
-        if(o1 == 0 and self.pointOn(p2)) or (o2 == 0 and self.pointOn(q2)):
-            return True
-        if(o3 == 0 and seg.pointOn(p1)) or (o4 == 0 and seg.pointOn(q1)):
-            return True
-        
-        return False
+        return segmentsIntersectFromCoordinates(self.x1, self.y1, self.x2, self.y2, seg.x1, seg.y1, seg.x2, seg.y2)
         
     def line(self):
         endpts = self.endpoints()
@@ -356,6 +337,8 @@ class Rect:  #Really an axis-aligned rectangle
     bottom_right  -- get bottom-right corner
     expanded_by  -- grow (or shrink)
     """
+    
+    __slots__ = ("left", "top", "right", "bottom")
 
     def __init__(self, pt1, pt2):
         """Initialize a rectangle from two points."""
@@ -430,6 +413,9 @@ class Rect:  #Really an axis-aligned rectangle
         return min(segs[0].distanceFromPoint(pt), segs[1].distanceFromPoint(pt),
             segs[2].distanceFromPoint(pt), segs[3].distanceFromPoint(pt))
             
+    def distanceFromPoints(self, points):  #distanceFromPoint for every point of a PointArray
+        return SegmentArray.FromSegments(self.segments()).distanceFromPoints(points.column()).min(axis=-1)
+            
     def center(self):
         return Point((self.left + self.right)/2.0, (self.top + self.bottom)/2.0)
                                
@@ -454,31 +440,417 @@ class Rect:  #Really an axis-aligned rectangle
         turtle.goto(turtleRect.left, turtleRect.top)
         turtle.penup()
   
-class Triangle:
+class Triangle:  #treated as immutable: the vertex coordinates are copied out once, for the coordinate-level tests
+    __slots__ = ("pt1", "pt2", "pt3", "coordinates")
+    
     def __init__(self, pt1, pt2, pt3):
         self.pt1 = pt1
         self.pt2 = pt2
         self.pt3 = pt3
+        self.coordinates = (pt1.x, pt1.y, pt2.x, pt2.y, pt3.x, pt3.y)
         
     def pointInside(self, pt):  #tests whether point is in the interior, so NOT on the boundary!
-        seg1 = Segment(self.pt1, self.pt2)
-        seg2 = Segment(self.pt2, self.pt3)
-        seg3 = Segment(self.pt3, self.pt1)
-        o1 = seg1.orientation(pt)
-        o2 = seg2.orientation(pt)
-        o3 = seg3.orientation(pt)
-        
-        return o1 == o2 and o2 == o3
+        return pointInTriangleFromCoordinates(*self.coordinates, pt.x, pt.y)
         
     def intersectsWithSegment(self, seg):
-        seg1 = Segment(self.pt1, self.pt2)
-        if seg.intersectsWithSegment(seg1):
-            return True
-        seg2 = Segment(self.pt2, self.pt3)
-        if seg.intersectsWithSegment(seg2):
-            return True
-        seg3 = Segment(self.pt3, self.pt1)
-        if seg.intersectsWithSegment(seg3):
-            return True
-        return self.pointInside(Point(seg.x1, seg.y1)) or self.pointInside(Point(seg.x2, seg.y2))
-    
\ No newline at end of file
+        return triangleIntersectsSegmentFromCoordinates(*self.coordinates, seg.x1, seg.y1, seg.x2, seg.y2)
+    
+
+class SegmentGridIndex:
+    """Uniform bucket grid over a fixed list of segments.
+    
+    query  -- indices of the segments whose bounding boxes overlap an axis-aligned box
+    
+    Boxes use the same (left, top, right, bottom) convention as Rect and touching
+    counts as overlapping, so the index never drops a segment that meets the box.
+    """
+    
+    def __init__(self, segs, bucketsPerSide=0):
+        self.boxes = [(min(seg.x1, seg.x2), min(seg.y1, seg.y2), max(seg.x1, seg.x2), max(seg.y1, seg.y2)) for seg in segs]
+        if bucketsPerSide == 0:
+            bucketsPerSide = max(1, int(math.ceil(math.sqrt(len(self.boxes)))))
+        self.bucketsPerSide = bucketsPerSide
+        
+        if len(self.boxes) == 0:
+            self.left = self.top = self.right = self.bottom = 0.0
+        else:
+            self.left = min(box[0] for box in self.boxes)
+            self.top = min(box[1] for box in self.boxes)
+            self.right = max(box[2] for box in self.boxes)
+            self.bottom = max(box[3] for box in self.boxes)
+        self.bucketWidth = (self.right - self.left)/bucketsPerSide or 1.0
+        self.bucketHeight = (self.bottom - self.top)/bucketsPerSide or 1.0
+        
+        self.buckets = [[[] for row in range(bucketsPerSide)] for col in range(bucketsPerSide)]
+        for i in range(len(self.boxes)):
+            (left, top, right, bottom) = self.boxes[i]
+            for col in range(self.bucketColumn(left), self.bucketColumn(right) + 1):
+                for row in range(self.bucketRow(top), self.bucketRow(bottom) + 1):
+                    self.buckets[col][row].append(i)
+                    
+    def bucketColumn(self, x):
+        return min(self.bucketsPerSide - 1, max(0, int((x - self.left)/self.bucketWidth)))
+    
+    def bucketRow(self, y):
+        return min(self.bucketsPerSide - 1, max(0, int((y - self.top)/self.bucketHeight)))
+        
+    def query(self, left, top, right, bottom):
+        """Return, in increasing order, the indices of the segments whose bounding boxes overlap the box."""
+        if len(self.boxes) == 0 or right < self.left or left > self.right or bottom < self.top or top > self.bottom:
+            return []
+        found = set()
+        for col in range(self.bucketColumn(left), self.bucketColumn(right) + 1):
+            for row in range(self.bucketRow(top), self.bucketRow(bottom) + 1):
+                found.update(self.buckets[col][row])
+        hits = []
+        for i in sorted(found):
+            box = self.boxes[i]
+            if box[0] <= right and left <= box[2] and box[1] <= bottom and top <= box[3]:
+                hits.append(i)
+        return hits
+
+
+# Robust orientation.  The orientation determinant (y2 - y1)*(px - x2) - (x2 - x1)*(py - y2) is
+# evaluated in floating point first, and its sign is certain unless its magnitude is below
+# ORIENTATION_ERROR_BOUND times the sum of the magnitudes of the two products (the orient2d filter of
+# Shewchuk, "Adaptive Precision Floating-Point Arithmetic and Fast Robust Geometric Predicates").  That
+# only happens when the products have the same sign and nearly cancel; those nearly colinear cases
+# are recomputed exactly with fractions.Fraction, which represents every float exactly.  So a point
+# exactly on a line is COLINEAR whatever the rounding.
+ORIENTATION_ERROR_BOUND = (3.0 + 16.0*2.0**-53)*2.0**-53
+
+def orientationSign(x1, y1, x2, y2, px, py):
+    #1, -1 or 0: the sign of the orientation determinant, exact for all float (or integer) inputs
+    left = (y2 - y1) * (px - x2)
+    right = (x2 - x1) * (py - y2)
+    val = left - right
+    if abs(val) < ORIENTATION_ERROR_BOUND * (abs(left) + abs(right)):
+        return exactOrientationSign(x1, y1, x2, y2, px, py)
+    return (val > 0) - (val < 0)
+
+def exactOrientationSign(x1, y1, x2, y2, px, py):
+    #1, -1 or 0: the sign of the orientation determinant in exact rational arithmetic
+    (x1, y1, x2, y2, px, py) = (Fraction(x1), Fraction(y1), Fraction(x2), Fraction(y2), Fraction(px), Fraction(py))
+    val = ((y2 - y1) * (px - x2)) - ((x2 - x1) * (py - y2))
+    return (val > 0) - (val < 0)
+
+def edgeCoefficients(x1, y1, x2, y2):
+    #(x1, y1, x2, y2, x2 - x1, y2 - y1): the directed line from (x1, y1) to (x2, y2), set up for edgeOrientationSign
+    return (x1, y1, x2, y2, x2 - x1, y2 - y1)
+
+def edgeOrientationSign(edge, px, py):
+    #orientationSign(x1, y1, x2, y2, px, py) for edge = edgeCoefficients(x1, y1, x2, y2), reusing its differences
+    (x1, y1, x2, y2, dx, dy) = edge
+    left = dy * (px - x2)
+    right = dx * (py - y2)
+    val = left - right
+    if abs(val) < ORIENTATION_ERROR_BOUND * (abs(left) + abs(right)):
+        return exactOrientationSign(x1, y1, x2, y2, px, py)
+    return (val > 0) - (val < 0)
+
+# Coordinate-level versions of the Segment and Triangle tests, for hot loops that would otherwise
+# build Point and Segment objects just to call them.  They give the same answers, boundary cases included.
+
+def orientationFromCoordinates(x1, y1, x2, y2, px, py):
+    #Segment(Point(x1, y1), Point(x2, y2)).orientation(Point(px, py))
+    val = orientationSign(x1, y1, x2, y2, px, py)
+    if val > 0:
+        return Segment.CLOCKWISE
+    elif val < 0:
+        return Segment.COUNTERCLOCKWISE
+    else:
+        return Segment.COLINEAR
+        
+def segmentsIntersectFromCoordinates(ax1, ay1, ax2, ay2, bx1, by1, bx2, by2):
+    #Segment.intersectsWithSegment: the endpoints of each segment are on different sides of (or one is on) the
+    #other's line.  Colinear overlaps do not count, as there (all four orientations COLINEAR) no pair differs
+    return (orientationFromCoordinates(ax1, ay1, ax2, ay2, bx1, by1) != orientationFromCoordinates(ax1, ay1, ax2, ay2, bx2, by2) and
+            orientationFromCoordinates(bx1, by1, bx2, by2, ax1, ay1) != orientationFromCoordinates(bx1, by1, bx2, by2, ax2, ay2))
+    
+def pointInTriangleFromCoordinates(x1, y1, x2, y2, x3, y3, px, py):
+    #Triangle.pointInside: the same orientation with respect to all three edges
+    o1 = orientationFromCoordinates(x1, y1, x2, y2, px, py)
+    return (o1 == orientationFromCoordinates(x2, y2, x3, y3, px, py) and
+            o1 == orientationFromCoordinates(x3, y3, x1, y1, px, py))
+    
+def triangleIntersectsSegmentFromCoordinates(x1, y1, x2, y2, x3, y3, sx1, sy1, sx2, sy2):
+    #Triangle.intersectsWithSegment with each orientation evaluated once (scalar twin of triangleIntersectsSegmentArray)
+    a1 = orientationFromCoordinates(x1, y1, x2, y2, sx1, sy1)
+    b1 = orientationFromCoordinates(x1, y1, x2, y2, sx2, sy2)
+    a2 = orientationFromCoordinates(x2, y2, x3, y3, sx1, sy1)
+    b2 = orientationFromCoordinates(x2, y2, x3, y3, sx2, sy2)
+    a3 = orientationFromCoordinates(x3, y3, x1, y1, sx1, sy1)
+    b3 = orientationFromCoordinates(x3, y3, x1, y1, sx2, sy2)
+    if (a1 == a2 and a2 == a3) or (b1 == b2 and b2 == b3): #an endpoint inside
+        return True
+    p1 = orientationFromCoordinates(sx1, sy1, sx2, sy2, x1, y1)
+    p2 = orientationFromCoordinates(sx1, sy1, sx2, sy2, x2, y2)
+    p3 = orientationFromCoordinates(sx1, sy1, sx2, sy2, x3, y3)
+    return (p1 != p2 and a1 != b1) or (p2 != p3 and a2 != b2) or (p3 != p1 and a3 != b3)
+
+def orientationArray(x1, y1, x2, y2, px, py):
+    """Vectorized Segment.orientation over numpy arrays (all arguments broadcast together).
+    
+    Evaluates the same determinant as Segment(Point(x1, y1), Point(x2, y2)).orientation(Point(px, py))
+    and returns its sign: 1 for CLOCKWISE, -1 for COUNTERCLOCKWISE and 0 for COLINEAR.  The entries the
+    floating point filter cannot decide are redone one by one with orientationSign.
+    """
+    val = ((y2 - y1) * (px - x2)) - ((x2 - x1) * (py - y2))
+    #a coarser filter, with one threshold for all entries: no coordinate exceeds magnitude, so each product
+    #is at most 4*(1 + eps)**3 * magnitude**2 and entries above the threshold pass orientationSign's filter too
+    magnitude = max(float(np.max(np.abs(a), initial=0.0)) for a in (x1, y1, x2, y2, px, py))
+    uncertain = np.abs(val) < ORIENTATION_ERROR_BOUND * 9.0 * magnitude * magnitude
+    if not uncertain.any():
+        return np.sign(val)
+    signs = np.array(np.sign(val), dtype=float)
+    flatSigns = signs.reshape(-1)
+    coordinates = [a.reshape(-1) for a in np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in (x1, y1, x2, y2, px, py)))]
+    for k in np.flatnonzero(uncertain).tolist():
+        flatSigns[k] = orientationSign(*(float(a[k]) for a in coordinates))
+    return signs
+
+def triangleIntersectsSegmentArray(x1, y1, x2, y2, x3, y3, sx1, sy1, sx2, sy2):
+    """Vectorized Triangle.intersectsWithSegment over numpy arrays (all arguments broadcast together).
+    
+    Returns a boolean array that agrees entry by entry with
+    Triangle(Point(x1, y1), Point(x2, y2), Point(x3, y3)).intersectsWithSegment(Segment(Point(sx1, sy1), Point(sx2, sy2))),
+    including its treatment of boundary and colinear cases.
+    """
+    #orientation of the triangle's vertices with respect to the segment
+    p1 = orientationArray(sx1, sy1, sx2, sy2, x1, y1)
+    p2 = orientationArray(sx1, sy1, sx2, sy2, x2, y2)
+    p3 = orientationArray(sx1, sy1, sx2, sy2, x3, y3)
+    #orientation of the segment's endpoints with respect to each triangle edge
+    a1 = orientationArray(x1, y1, x2, y2, sx1, sy1)
+    b1 = orientationArray(x1, y1, x2, y2, sx2, sy2)
+    a2 = orientationArray(x2, y2, x3, y3, sx1, sy1)
+    b2 = orientationArray(x2, y2, x3, y3, sx2, sy2)
+    a3 = orientationArray(x3, y3, x1, y1, sx1, sy1)
+    b3 = orientationArray(x3, y3, x1, y1, sx2, sy2)
+    
+    crossesEdge = ((p1 != p2) & (a1 != b1)) | ((p2 != p3) & (a2 != b2)) | ((p3 != p1) & (a3 != b3))
+    endpointInside = ((a1 == a2) & (a2 == a3)) | ((b1 == b2) & (b2 == b3))
+    return crossesEdge | endpointInside
+
+def segmentsIntersectArray(ax1, ay1, ax2, ay2, bx1, by1, bx2, by2):
+    #vectorized Segment.intersectsWithSegment (and segmentsIntersectFromCoordinates), arguments broadcast together
+    return ((orientationArray(ax1, ay1, ax2, ay2, bx1, by1) != orientationArray(ax1, ay1, ax2, ay2, bx2, by2)) &
+            (orientationArray(bx1, by1, bx2, by2, ax1, ay1) != orientationArray(bx1, by1, bx2, by2, ax2, ay2)))
+
+def pointInTriangleArray(x1, y1, x2, y2, x3, y3, px, py):
+    #vectorized Triangle.pointInside: the same orientation (COLINEAR included) with respect to all three edges
+    o1 = orientationArray(x1, y1, x2, y2, px, py)
+    return (o1 == orientationArray(x2, y2, x3, y3, px, py)) & (o1 == orientationArray(x3, y3, x1, y1, px, py))
+
+def pointOnSegmentArray(x1, y1, x2, y2, px, py):
+    #vectorized Segment.pointOn, which only checks the bounding box (boundary included)
+    return ((np.minimum(x1, x2) <= px) & (px <= np.maximum(x1, x2)) &
+            (np.minimum(y1, y2) <= py) & (py <= np.maximum(y1, y2)))
+
+def distanceFromSegmentArray(x1, y1, x2, y2, px, py):
+    #vectorized Segment.distanceFromPoint; a segment of length 0 measures from its first endpoint
+    (C, D) = (x2 - x1, y2 - y1)
+    lengthSq = C*C + D*D
+    with np.errstate(divide="ignore", invalid="ignore"):
+        param = np.where(lengthSq != 0, ((px - x1)*C + (py - y1)*D) / lengthSq, -1.0)
+    xx = np.where(param < 0, x1, np.where(param > 1, x2, x1 + param*C))
+    yy = np.where(param < 0, y1, np.where(param > 1, y2, y1 + param*D))
+    return np.sqrt((px - xx)*(px - xx) + (py - yy)*(py - yy))
+
+
+class PointArray:
+    """Points as a struct of numpy arrays: point k is (xs[k], ys[k]).
+    
+    Used with SegmentArray for batched tests.  Arrays broadcast against each other as numpy
+    arrays do: equal lengths are compared pairwise, and points.column() against a SegmentArray
+    gives a (points x segments) table.
+    
+    point  -- kth point as a Point
+    column  -- the same points as a column, for tables against a SegmentArray
+    insideTriangles  -- Triangle.pointInside for triangles given by three PointArrays
+    """
+    
+    __slots__ = ("xs", "ys")
+    
+    def __init__(self, xs, ys):
+        self.xs = np.asarray(xs, dtype=float)
+        self.ys = np.asarray(ys, dtype=float)
+        
+    @staticmethod
+    def FromPoints(points):
+        return PointArray([pt.x for pt in points], [pt.y for pt in points])
+        
+    def __len__(self):
+        return len(self.xs)
+    
+    def __getitem__(self, k): #slices and index arrays give a PointArray
+        return PointArray(self.xs[k], self.ys[k])
+        
+    def point(self, k):
+        return Point(float(self.xs[k]), float(self.ys[k]))
+        
+    def column(self):
+        return PointArray(self.xs[:, None], self.ys[:, None])
+        
+    def insideTriangles(self, pt1s, pt2s, pt3s):
+        return pointInTriangleArray(pt1s.xs, pt1s.ys, pt2s.xs, pt2s.ys, pt3s.xs, pt3s.ys, self.xs, self.ys)
+        
+
+class SegmentArray:
+    """Segments as a struct of numpy arrays: segment k runs from (x1s[k], y1s[k]) to (x2s[k], y2s[k]).
+    
+    The batched tests follow the boundary rules of the Segment and Triangle methods they are
+    named after, and broadcast as in PointArray.
+    
+    orientation  -- Segment.orientation as signs: 1 CLOCKWISE, -1 COUNTERCLOCKWISE, 0 COLINEAR
+    pointOn  -- Segment.pointOn
+    intersects  -- Segment.intersectsWithSegment against another SegmentArray
+    intersectsTriangles  -- Triangle.intersectsWithSegment for triangles given by three PointArrays
+    distanceFromPoints  -- Segment.distanceFromPoint
+    """
+    
+    __slots__ = ("x1s", "y1s", "x2s", "y2s")
+    
+    def __init__(self, x1s, y1s, x2s, y2s):
+        self.x1s = np.asarray(x1s, dtype=float)
+        self.y1s = np.asarray(y1s, dtype=float)
+        self.x2s = np.asarray(x2s, dtype=float)
+        self.y2s = np.asarray(y2s, dtype=float)
+        
+    @staticmethod
+    def FromSegments(segs):
+        return SegmentArray([seg.x1 for seg in segs], [seg.y1 for seg in segs], [seg.x2 for seg in segs], [seg.y2 for seg in segs])
+        
+    def __len__(self):
+        return len(self.x1s)
+    
+    def __getitem__(self, k): #slices and index arrays give a SegmentArray
+        return SegmentArray(self.x1s[k], self.y1s[k], self.x2s[k], self.y2s[k])
+        
+    def segment(self, k):
+        return Segment(Point(float(self.x1s[k]), float(self.y1s[k])), Point(float(self.x2s[k]), float(self.y2s[k])))
+        
+    def startPoints(self):
+        return PointArray(self.x1s, self.y1s)
+    
+    def endPoints(self):
+        return PointArray(self.x2s, self.y2s)
+        
+    def orientation(self, points):
+        return orientationArray(self.x1s, self.y1s, self.x2s, self.y2s, points.xs, points.ys)
+        
+    def pointOn(self, points):
+        return pointOnSegmentArray(self.x1s, self.y1s, self.x2s, self.y2s, points.xs, points.ys)
+        
+    def intersects(self, other):
+        return segmentsIntersectArray(self.x1s, self.y1s, self.x2s, self.y2s, other.x1s, other.y1s, other.x2s, other.y2s)
+        
+    def intersectsTriangles(self, pt1s, pt2s, pt3s):
+        return triangleIntersectsSegmentArray(pt1s.xs, pt1s.ys, pt2s.xs, pt2s.ys, pt3s.xs, pt3s.ys, self.x1s, self.y1s, self.x2s, self.y2s)
+        
+    def distanceFromPoints(self, points):
+        return distanceFromSegmentArray(self.x1s, self.y1s, self.x2s, self.y2s, points.xs, points.ys)
+
+def arrangementFacePoints(segments, rect, tolerance=1e-9):
+    """One point inside each face of the arrangement of the given segments within a rectangle.
+    
+    segments is a sequence of (x1, y1, x2, y2) rows lying in rect.  The rectangle is cut into
+    vertical slabs at every segment endpoint and crossing, so the segments spanning a slab do not
+    cross inside it and cut it into trapezoids.  Trapezoids of neighbouring slabs whose sides on the
+    slab line overlap, other than along a vertical segment, are in the same face and are merged
+    (union-find).  Returns (xs, ys) arrays with the center of the largest trapezoid of every face.
+    Coordinates closer than tolerance times the rectangle size are taken to be equal.
+    """
+    eps = tolerance * max(rect.right - rect.left, rect.bottom - rect.top)
+    segs = np.array(segments, dtype=float).reshape(len(segments), 4)
+    backwards = segs[:, 0] > segs[:, 2]
+    segs[backwards] = segs[backwards][:, [2, 3, 0, 1]] #left to right
+    isVertical = segs[:, 2] - segs[:, 0] <= eps
+    verticals = segs[isVertical]
+    segs = segs[~isVertical]
+    slopes = (segs[:, 3] - segs[:, 1]) / (segs[:, 2] - segs[:, 0])
+    
+    #slab boundaries: the rectangle's sides, the segment endpoints and the crossings of any two segments
+    allSegs = np.concatenate((segs, verticals))
+    xs = [np.array([rect.left, rect.right]), allSegs[:, 0], allSegs[:, 2]]
+    (first, second) = np.triu_indices(len(allSegs), 1)
+    (ax, ay, bx, by) = (allSegs[first, 0], allSegs[first, 1], allSegs[first, 2], allSegs[first, 3])
+    (cx, cy, dx, dy) = (allSegs[second, 0], allSegs[second, 1], allSegs[second, 2], allSegs[second, 3])
+    denominator = (bx - ax)*(dy - cy) - (by - ay)*(dx - cx)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = ((cx - ax)*(dy - cy) - (cy - ay)*(dx - cx)) / denominator
+        u = ((cx - ax)*(by - ay) - (cy - ay)*(bx - ax)) / denominator
+    crossing = (denominator != 0) & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+    xs.append(ax[crossing] + t[crossing]*(bx[crossing] - ax[crossing]))
+    xs = np.unique(np.clip(np.concatenate(xs), rect.left, rect.right))
+    xs = xs[np.concatenate(([True], np.diff(xs) > eps))]
+    xs[-1] = rect.right
+    
+    parent = []
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    
+    def sharesSide(low, high, x):
+        #does the open interval (low, high) of the slab line at x have a piece of positive length not on a vertical segment?
+        blocked = sorted((min(v[1], v[3]), max(v[1], v[3])) for v in verticals if abs(v[0] - x) <= eps and min(v[1], v[3]) < high and max(v[1], v[3]) > low)
+        for (blockLow, blockHigh) in blocked:
+            if blockLow - low > eps:
+                return True
+            low = max(low, blockHigh)
+        return high - low > eps
+    
+    areas = []
+    pointXs = []
+    pointYs = []
+    previous = None #(lows, highs, first trapezoid) on the right side of the previous slab
+    for k in range(len(xs) - 1):
+        (left, right) = (xs[k], xs[k + 1])
+        middle = (left + right)/2.0
+        spanning = np.nonzero((segs[:, 0] <= left + eps) & (segs[:, 2] >= right - eps))[0]
+        yMiddle = segs[spanning, 1] + slopes[spanning]*(middle - segs[spanning, 0])
+        inside = (yMiddle > rect.top + eps) & (yMiddle < rect.bottom - eps)
+        (spanning, yMiddle) = (spanning[inside], yMiddle[inside])
+        order = np.argsort(yMiddle, kind="stable")
+        (spanning, yMiddle) = (spanning[order], yMiddle[order])
+        distinct = np.ones(len(yMiddle), dtype=bool) #overlapping segments bound the same trapezoids
+        distinct[1:] = np.diff(yMiddle) > eps
+        (spanning, yMiddle) = (spanning[distinct], yMiddle[distinct])
+        yLeft = segs[spanning, 1] + slopes[spanning]*(left - segs[spanning, 0])
+        yRight = segs[spanning, 1] + slopes[spanning]*(right - segs[spanning, 0])
+        
+        firstTrapezoid = len(parent)
+        lows = np.concatenate(([rect.top], yMiddle))
+        highs = np.concatenate((yMiddle, [rect.bottom]))
+        for i in range(len(lows)):
+            parent.append(len(parent))
+            areas.append((right - left)*(highs[i] - lows[i]))
+            pointXs.append(middle)
+            pointYs.append((lows[i] + highs[i])/2.0)
+        
+        if previous != None:
+            (previousLows, previousHighs, previousFirst) = previous
+            currentLows = np.concatenate(([rect.top], yLeft)).tolist()
+            currentHighs = np.concatenate((yLeft, [rect.bottom])).tolist()
+            i = 0
+            j = 0
+            while i < len(previousLows) and j < len(currentLows):
+                low = max(previousLows[i], currentLows[j])
+                high = min(previousHighs[i], currentHighs[j])
+                if high - low > eps and sharesSide(low, high, left):
+                    parent[find(previousFirst + i)] = find(firstTrapezoid + j)
+                if previousHighs[i] < currentHighs[j]:
+                    i += 1
+                else:
+                    j += 1
+        previous = (np.concatenate(([rect.top], yRight)).tolist(), np.concatenate((yRight, [rect.bottom])).tolist(), firstTrapezoid)
+    
+    largest = {} #face -> its largest trapezoid
+    for i in range(len(parent)):
+        face = find(i)
+        if face not in largest or areas[i] > areas[largest[face]]:
+            largest[face] = i
+    chosen = sorted(largest.values())
+    return (np.array([pointXs[i] for i in chosen]), np.array([pointYs[i] for i in chosen]))
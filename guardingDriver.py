@@ -9,10 +9,20 @@ from dataCenter import *
 EPSILON = 3.0
 NUM_RACKS = 20
 SLEEP_TIME_AT_END_OF_DRAWING = 5
-HARD_NUM_ITERATIONS = 6
+HARD_NUM_ITERATIONS = 6 #refinement stops earlier once the number of guards is unchanged for STABLE_ROUNDS iterations (or reaches the witness lower bound)
+STABLE_ROUNDS = 1 #a larger value guards against plateaus at the price of extra (ever more costly) iterations
+TIME_BUDGET = None #seconds, None for no limit
+MAX_CANDIDATES = None #None for no limit
+USE_WITNESS_BOUND = False #stop refining once the guards reach witnessLowerBound(); costly (O(R^3) arrangement) for many racks
 TURTLE_SPEED = 0
 SAVE_TO_FILE = True
 LOAD_DC_FROM_STORED_JSON = True
+VISIBILITY_ENGINE = DataCenter.VISIBILITY_VECTORIZED
+VISIBILITY_WORKERS = 1 #more than 1 computes the guarding matrix in a process pool
+RETAIN_CANDIDATES = True #keep the candidates of coarser grids so their visibility is reused after refining
+REFINEMENT = DataCenterGrid.REFINE_GLOBAL #REFINE_ADAPTIVE only splits the cells where visibility changes
+ARRANGEMENT_CANDIDATES = False #one candidate per face of the critical line arrangement instead of grid cell centers; needs a single iteration (exact for COMPLETE_COVERAGE)
+SOLVE_MODE = DataCenter.SOLVE_AUTO #SOLVE_MIP or SOLVE_BRANCH_AND_BOUND to force either exact solver, SOLVE_HEURISTIC for a fast cover with a lower bound instead of a proven optimum, SOLVE_COLUMN_GENERATION for very many candidates
 
 SAVED_IMAGES = "images/"
 BACKED_UP_IMAGES = SAVED_IMAGES + "backup/" #saves images from prior run (only)
@@ -63,29 +73,39 @@ if not res:
     logging.error("Could not create requisite number of racks! Aborting.")
     sys.exit() 
 
-dataCenter.createInitialGrid()
+dataCenter.setVisibilityEngine(VISIBILITY_ENGINE)
+dataCenter.setNumVisibilityWorkers(VISIBILITY_WORKERS)
+dataCenter.setSolveMode(SOLVE_MODE)
+dataCenter.createInitialGrid(retainCandidates=RETAIN_CANDIDATES, refinement=REFINEMENT)
 
 tt = turtle.Turtle();
 tt.speed(TURTLE_SPEED)
-iters = 0
-while iters < HARD_NUM_ITERATIONS:
-    dataCenter.grid.generateCandidateGuardSet()
-    dataCenter.generateGuardingMatrix()
-    numGuards = dataCenter.findMinimalGuardSet()
+
+def showIteration(entry):
     tt.clear()
     dataCenter.draw(tt, drawGrid=True, drawCandidateGuards=False)
     tt.setpos(-140, -380)
     tt.pendown()
-    tt.write("# Segments = " + str(NUM_RACKS) + ", # Guards = " + str(numGuards), font=("Arial", 20, "normal"))
+    tt.write("# Segments = " + str(NUM_RACKS) + ", # Guards = " + str(entry["numGuards"]), font=("Arial", 20, "normal"))
     tt.penup()
     time.sleep(SLEEP_TIME_AT_END_OF_DRAWING)
     if SAVE_TO_FILE:
         turtleScreen = tt.getscreen()
-        turtleScreen.getcanvas().postscript(file=SAVED_IMAGES + "data_center" + str(iters) + ".eps")
-        jsonFile = open(SAVED_IMAGES + "data_center" + str(iters) + ".json", "w")
+        turtleScreen.getcanvas().postscript(file=SAVED_IMAGES + "data_center" + str(entry["iteration"]) + ".eps")
+        jsonFile = open(SAVED_IMAGES + "data_center" + str(entry["iteration"]) + ".json", "w")
         jsonFile.write(dataCenter.toJSON())
         jsonFile.close()
-    iters += 1
-    dataCenter.grid.refineGrid()
+
+if ARRANGEMENT_CANDIDATES: #refining the grid would not change the candidates
+    dataCenter.generateArrangementCandidates()
+    dataCenter.generateGuardingMatrix()
+    dataCenter.reduceCandidates()
+    showIteration({"iteration": 0, "numGuards": dataCenter.findMinimalGuardSet()})
+else:
+    history = dataCenter.refineUntilConverged(stableRounds=STABLE_ROUNDS, timeBudget=TIME_BUDGET, maxCandidates=MAX_CANDIDATES,
+                                              useWitnessBound=USE_WITNESS_BOUND, maxIterations=HARD_NUM_ITERATIONS, callback=showIteration)
+    for entry in history:
+        logging.info("Iteration " + str(entry["iteration"]) + ": " + str(entry["numGuards"]) + " guards from " 
+                     + str(entry["numCandidates"]) + " candidates in " + str(round(entry["seconds"], 2)) + " seconds")
 
 print("Done!")
\ No newline at end of file
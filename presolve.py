@@ -0,0 +1,151 @@
+import logging
+
+from setCover import *
+
+# Set cover presolve.  Works on the instance format of setCover.py (rackSets[i] lists the columns
+# covering rack i) and repeats the standard reductions until none applies:
+#   - a rack covered by a single column forces that column, and every rack it covers is dropped
+#   - a rack whose columns include all the columns of another rack is dominated (covering the
+#     other one covers it too) and is dropped
+#   - a column whose remaining racks are a subset of another column's is dropped (reduceColumns)
+
+class CoverPresolve:
+    def __init__(self, rackSets, numColumns):
+        self.originalRackSets = rackSets
+        self.numColumns = numColumns
+        self.forced = [] #columns that are in every minimal cover (in the order they were forced)
+        self.racks = [] #racks left to cover
+        self.columns = [] #columns left, in increasing order
+        self.rackSets = [] #kth entry lists the positions in columns covering racks[k]
+        self.infeasible = False #some rack is not covered by any column
+        self.numRounds = 0
+        self.numRacksCoveredByForced = 0
+        self.numRacksDominated = 0
+        self.numColumnsDominated = 0
+
+    def run(self):
+        columnSets = [set(s) for s in self.originalRackSets]
+        racks = list(range(len(columnSets)))
+        alive = set()
+        for s in columnSets:
+            alive.update(s)
+        forcedSet = set()
+
+        changed = True
+        while changed:
+            changed = False
+            self.numRounds += 1
+            for i in racks:
+                if len(columnSets[i]) == 0:
+                    self.infeasible = True
+                    logging.info("Presolve: rack " + str(i) + " is not seen by any candidate guard")
+                    return self
+
+            #forced columns
+            newlyForced = set()
+            for i in racks:
+                if len(columnSets[i]) == 1:
+                    newlyForced.update(columnSets[i])
+            if len(newlyForced) > 0:
+                self.forced.extend(sorted(newlyForced))
+                forcedSet.update(newlyForced)
+                remaining = [i for i in racks if columnSets[i].isdisjoint(newlyForced)]
+                self.numRacksCoveredByForced += len(racks) - len(remaining)
+                racks = remaining
+                alive.difference_update(newlyForced)
+                changed = True
+
+            #dominated racks
+            remaining = self.undominatedRacks(racks, columnSets)
+            if len(remaining) < len(racks):
+                self.numRacksDominated += len(racks) - len(remaining)
+                racks = remaining
+                changed = True
+
+            #dominated columns, over what is left of the racks
+            used = set()
+            for i in racks:
+                used.update(columnSets[i])
+            columnList = sorted(used)
+            position = {}
+            for k in range(len(columnList)):
+                position[columnList[k]] = k
+            (kept, reducedRackSets) = reduceColumns([[position[j] for j in columnSets[i]] for i in racks], len(columnList))
+            keptSet = set(columnList[k] for k in kept)
+            if len(keptSet) < len(alive):
+                self.numColumnsDominated += len(alive) - len(keptSet)
+                alive = keptSet
+                for i in racks:
+                    columnSets[i].intersection_update(keptSet)
+                changed = True
+
+        self.racks = racks
+        self.columns = sorted(alive)
+        position = {}
+        for k in range(len(self.columns)):
+            position[self.columns[k]] = k
+        self.rackSets = [sorted(position[j] for j in columnSets[i]) for i in racks]
+        logging.info(self.report())
+        return self
+
+    @staticmethod
+    def undominatedRacks(racks, columnSets):
+        #drops every rack whose columns include all the columns of another rack (of identical racks the first is kept)
+        keptByColumn = {} #a kept rack is filed under its smallest column, which any rack it dominates must contain
+        kept = []
+        for i in sorted(racks, key=lambda i: (len(columnSets[i]), i)):
+            dominated = False
+            for j in columnSets[i]:
+                for k in keptByColumn.get(j, ()):
+                    if columnSets[k] <= columnSets[i]:
+                        dominated = True
+                        break
+                if dominated:
+                    break
+            if not dominated:
+                kept.append(i)
+                keptByColumn.setdefault(min(columnSets[i]), []).append(i)
+        return sorted(kept)
+
+    def reducedCover(self, cover):
+        #positions in columns forming a cover of the remaining racks that is no larger than the given
+        #cover of the original instance (less its forced columns), or None if it does not cover every rack
+        position = {}
+        for k in range(len(self.columns)):
+            position[self.columns[k]] = k
+        racksOfColumn = {}
+        for k in range(len(self.racks)):
+            for j in self.originalRackSets[self.racks[k]]:
+                if j in cover:
+                    racksOfColumn.setdefault(j, []).append(k)
+        reduced = set()
+        for (j, racks) in racksOfColumn.items():
+            if j in position:
+                reduced.add(position[j])
+                continue
+            covering = set(self.rackSets[racks[0]]) #a kept column covering every remaining rack that j covers
+            for k in racks[1:]:
+                covering.intersection_update(self.rackSets[k])
+            if len(covering) == 0:
+                return None
+            reduced.add(min(covering))
+        for k in range(len(self.racks)):
+            if reduced.isdisjoint(self.rackSets[k]):
+                return None
+        return sorted(reduced)
+
+    def solution(self, reducedSolution):
+        #columns of the original instance for a solution given as positions in columns
+        return self.forced + [self.columns[k] for k in reducedSolution]
+
+    def report(self):
+        if self.infeasible:
+            return "Presolve: infeasible, some rack is not covered by any column"
+        return ("Presolve (" + str(self.numRounds) + " rounds): " + str(len(self.forced)) + " forced columns covering "
+                + str(self.numRacksCoveredByForced) + " racks, " + str(self.numRacksDominated) + " dominated racks and "
+                + str(self.numColumnsDominated) + " dominated columns removed; " + str(len(self.racks)) + " of "
+                + str(len(self.originalRackSets)) + " racks and " + str(len(self.columns)) + " of " + str(self.numColumns)
+                + " columns left")
+
+def presolveCover(rackSets, numColumns):
+    return CoverPresolve(rackSets, numColumns).run()
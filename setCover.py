@@ -0,0 +1,224 @@
+import logging
+import heapq
+
+# Set cover instances are given by rack: rackSets[i] lists the columns (candidate guards)
+# that cover row i (rack i).  Columns are numbered 0 .. numColumns-1.
+
+def columnMasks(rackSets, numColumns):
+    #rack coverage of every column as an integer bitmask (bit i set <=> the column covers rack i)
+    masks = [0] * numColumns
+    for i in range(len(rackSets)):
+        bit = 1 << i
+        for j in rackSets[i]:
+            masks[j] |= bit
+    return masks
+
+def rackSetsFromMasks(masks, numRacks):
+    rackSets = [[] for i in range(numRacks)]
+    for k in range(len(masks)):
+        mask = masks[k]
+        while mask:
+            low = mask & -mask
+            rackSets[low.bit_length() - 1].append(k)
+            mask ^= low
+    return rackSets
+
+def reduceColumns(rackSets, numColumns):
+    """Merge identical columns and drop dominated ones.
+
+    A column whose racks are a subset of another column's racks can be swapped for that column
+    in any cover, so only the maximal distinct columns are kept (empty columns are dropped too).
+    Returns (columns, reducedRackSets): columns[k] is the original column standing for the kth
+    kept one (the lowest index among its duplicates) and reducedRackSets is the instance over
+    the kept columns.
+    """
+    masks = columnMasks(rackSets, numColumns)
+    firstWithMask = {}
+    for j in range(numColumns):
+        if masks[j] != 0 and masks[j] not in firstWithMask:
+            firstWithMask[masks[j]] = j
+
+    #a column can only be dominated by one covering more racks, so visit them by decreasing size
+    distinct = sorted(firstWithMask, key=lambda mask: (-bin(mask).count("1"), firstWithMask[mask]))
+    keptByRack = [[] for i in range(len(rackSets))]
+    kept = []
+    for mask in distinct:
+        #any dominating column must cover every rack of this one; check those kept for its rarest rack
+        bucket = None
+        bits = mask
+        while bits:
+            low = bits & -bits
+            rackBucket = keptByRack[low.bit_length() - 1]
+            if bucket == None or len(rackBucket) < len(bucket):
+                bucket = rackBucket
+            bits ^= low
+        if any(mask & ~other == 0 for other in bucket):
+            continue
+        kept.append(mask)
+        bits = mask
+        while bits:
+            low = bits & -bits
+            keptByRack[low.bit_length() - 1].append(mask)
+            bits ^= low
+
+    kept.sort(key=lambda mask: firstWithMask[mask])
+    columns = [firstWithMask[mask] for mask in kept]
+    logging.info("Candidate reduction: " + str(numColumns) + " columns, " + str(len(firstWithMask)) + " distinct non-empty, "
+                 + str(len(columns)) + " undominated")
+    return (columns, rackSetsFromMasks(kept, len(rackSets)))
+
+def columnRackLists(rackSets, numColumns):
+    #the transpose of rackSets: the racks covered by each column
+    columnRacks = [[] for j in range(numColumns)]
+    for i in range(len(rackSets)):
+        for j in rackSets[i]:
+            columnRacks[j].append(i)
+    return columnRacks
+
+def greedyMaxCoverage(rackSets, numColumns, weights, budget):
+    """Pick up to budget columns covering as much rack weight as possible.
+
+    Lazy greedy: marginal gains only shrink as racks get covered, so a column popped from the
+    priority queue whose recomputed gain still beats the next entry is the best choice.  This
+    gives the usual (1 - 1/e) guarantee.  Returns the chosen columns in the order picked.
+    """
+    columnRacks = columnRackLists(rackSets, numColumns)
+    covered = [False] * len(rackSets)
+    heap = [(-sum(weights[i] for i in columnRacks[j]), j) for j in range(numColumns)]
+    heapq.heapify(heap)
+    chosen = []
+    while heap and len(chosen) < budget:
+        (negativeGain, j) = heapq.heappop(heap)
+        gain = sum(weights[i] for i in columnRacks[j] if not covered[i])
+        if gain <= 0:
+            continue
+        if heap and gain < -heap[0][0]:
+            heapq.heappush(heap, (-gain, j)) #stale entry, re-queue with its current gain
+            continue
+        chosen.append(j)
+        for i in columnRacks[j]:
+            covered[i] = True
+    return chosen
+
+def greedySetCover(rackSets, numColumns):
+    """Cover every rack greedily, always taking the column that covers the most uncovered racks.
+
+    Lazy evaluation as in greedyMaxCoverage.  The cover is within a factor H(max column size)
+    of the minimum.  Returns the chosen columns in the order picked, or None if some rack is
+    not covered by any column.
+    """
+    if any(len(s) == 0 for s in rackSets):
+        return None
+    weights = [1] * len(rackSets)
+    return greedyMaxCoverage(rackSets, numColumns, weights, len(rackSets))
+
+def coverInOrder(rackSets, numColumns, order):
+    #walks the columns in the given order taking each one that covers a rack not yet covered
+    columnRacks = columnRackLists(rackSets, numColumns)
+    covered = [False] * len(rackSets)
+    chosen = []
+    for j in order:
+        if any(not covered[i] for i in columnRacks[j]):
+            chosen.append(j)
+            for i in columnRacks[j]:
+                covered[i] = True
+    if not all(covered):
+        return None
+    return chosen
+
+def removeRedundantColumns(rackSets, numColumns, chosen):
+    #drops chosen columns all of whose racks are covered by other chosen columns, trying the
+    #last picked (usually the least useful) first
+    columnRacks = columnRackLists(rackSets, numColumns)
+    timesCovered = [0] * len(rackSets)
+    for j in chosen:
+        for i in columnRacks[j]:
+            timesCovered[i] += 1
+    kept = []
+    for j in reversed(chosen):
+        if all(timesCovered[i] > 1 for i in columnRacks[j]):
+            for i in columnRacks[j]:
+                timesCovered[i] -= 1
+        else:
+            kept.append(j)
+    kept.reverse()
+    return kept
+
+def disjointRacksBound(rackSets):
+    #lower bound on the cover size: racks with pairwise disjoint column sets need distinct columns.
+    #Picks such racks greedily, those with the fewest columns first
+    used = set()
+    bound = 0
+    for i in sorted(range(len(rackSets)), key=lambda i: len(rackSets[i])):
+        if used.isdisjoint(rackSets[i]):
+            used.update(rackSets[i])
+            bound += 1
+    return bound
+
+def exactSetCover(rackSets, numColumns, maxNodes=1000000):
+    """Minimum set cover by depth-first branch and bound, for instances with few racks.
+
+    Racks and columns are integer bitmasks, so a node is just the mask of the uncovered racks.
+    Each node branches on the uncovered rack with the fewest columns, over those of its columns
+    that are not dominated on the uncovered racks.  A node is pruned when a disjoint racks bound
+    shows it cannot beat the best cover so far (the greedy cover to start with), or when the
+    same uncovered racks were already reached with no more columns.  Returns the columns of a
+    minimum cover, or None if some rack is not covered or maxNodes nodes did not suffice.
+    """
+    if any(len(s) == 0 for s in rackSets):
+        return None
+    masks = columnMasks(rackSets, numColumns)
+    rackColumnMasks = [0] * len(rackSets) #bit j set <=> column j covers the rack
+    for i in range(len(rackSets)):
+        for j in rackSets[i]:
+            rackColumnMasks[i] |= 1 << j
+    rackOrder = sorted(range(len(rackSets)), key=lambda i: len(rackSets[i])) #fewest columns first
+    best = removeRedundantColumns(rackSets, numColumns, greedySetCover(rackSets, numColumns))
+    chosen = []
+    reached = {} #uncovered racks -> fewest columns with which they were reached
+    numNodes = 0
+
+    def lowerBound(uncovered):
+        used = 0
+        bound = 0
+        for i in rackOrder:
+            if (uncovered >> i) & 1 and rackColumnMasks[i] & used == 0:
+                used |= rackColumnMasks[i]
+                bound += 1
+        return bound
+
+    def search(uncovered):
+        nonlocal best, numNodes
+        if uncovered == 0:
+            if len(chosen) < len(best):
+                best = list(chosen)
+            return True
+        numNodes += 1
+        if numNodes > maxNodes:
+            return False
+        depth = len(chosen)
+        if reached.get(uncovered, len(best)) <= depth:
+            return True
+        reached[uncovered] = depth
+        if depth + lowerBound(uncovered) >= len(best):
+            return True
+        rack = next(i for i in rackOrder if (uncovered >> i) & 1)
+        options = sorted(rackSets[rack], key=lambda j: -bin(masks[j] & uncovered).count("1"))
+        branched = []
+        for j in options:
+            covers = masks[j] & uncovered
+            if any(covers & ~other == 0 for other in branched):
+                continue
+            branched.append(covers)
+            chosen.append(j)
+            finished = search(uncovered & ~covers)
+            chosen.pop()
+            if not finished:
+                return False
+        return True
+
+    if not search((1 << len(rackSets)) - 1):
+        logging.info("Exact set cover gave up after " + str(maxNodes) + " nodes")
+        return None
+    logging.info("Exact set cover: " + str(len(best)) + " columns, " + str(numNodes) + " nodes")
+    return sorted(best)
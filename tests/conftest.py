@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dataCenter import *
+
+
+@pytest.fixture
+def smallDataCenter():
+    #two facing vertical racks with two horizontal racks between them, one guarding up and one down;
+    #candidates are retained across refinements
+    dataCenter = DataCenter(Rect(Point(0.0, 0.0), Point(100.0, 100.0)), 3.0)
+    dataCenter.racks = [Rack(Segment(Point(20.0, 10.0), Point(20.0, 90.0)), Rack.RIGHT),
+                        Rack(Segment(Point(80.0, 10.0), Point(80.0, 90.0)), Rack.LEFT),
+                        Rack(Segment(Point(30.0, 50.0), Point(70.0, 50.0)), Rack.UP),
+                        Rack(Segment(Point(30.0, 30.0), Point(70.0, 30.0)), Rack.DOWN)]
+    dataCenter.createInitialGrid(retainCandidates=True)
+    return dataCenter
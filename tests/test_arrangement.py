@@ -0,0 +1,42 @@
+import random
+
+import numpy as np
+import pytest
+
+from dataCenter import *
+
+
+def randomDataCenter():
+    random.seed(20)
+    dataCenter = DataCenter(Rect(Point(0.0, 0.0), Point(100.0, 100.0)), 3.0)
+    dataCenter.placeRandomOrthogonalRacks(10, growthMethod=DataCenter.GROW_ONE_BY_ONE)
+    dataCenter.createInitialGrid()
+    return dataCenter
+
+
+def assertArrangementCandidatesDominate(dataCenter, model):
+    #with COMPLETE_COVERAGE no location sees racks that no arrangement candidate sees together, so the
+    #candidates lose nothing against guards placed anywhere in boundaryRect
+    dataCenter.setGuardingModel(model, DataCenter.COMPLETE_COVERAGE, 0.0)
+    dataCenter.setVisibilityEngine(DataCenter.VISIBILITY_VECTORIZED)
+    dataCenter.generateArrangementCandidates()
+    dataCenter.generateGuardingMatrix()
+    candidateSets = [frozenset(racks) for racks in dataCenter.grid.visibleRacks]
+    maximalSets = [s for s in set(candidateSets) if not any(s < other for other in candidateSets)]
+
+    rng = np.random.default_rng(20)
+    rect = dataCenter.boundaryRect
+    xs = rng.uniform(rect.left, rect.right, 5000)
+    ys = rng.uniform(rect.top, rect.bottom, 5000)
+    for racks in dataCenter.visibleRacksAtLocations(xs, ys):
+        assert any(set(racks) <= s for s in maximalSets)
+
+
+@pytest.mark.parametrize("model", [DataCenter.POSERS_CHOICE, DataCenter.SOLVERS_CHOICE])
+def test_arrangement_candidates_on_a_random_layout(model):
+    assertArrangementCandidatesDominate(randomDataCenter(), model)
+
+
+@pytest.mark.parametrize("model", [DataCenter.POSERS_CHOICE, DataCenter.SOLVERS_CHOICE])
+def test_arrangement_candidates_on_the_small_layout(smallDataCenter, model):
+    assertArrangementCandidatesDominate(smallDataCenter, model)
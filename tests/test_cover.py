@@ -0,0 +1,53 @@
+import numpy as np
+
+from dataCenter import *
+
+
+def incremental(dataCenter):
+    dataCenter.solveMode = DataCenter.SOLVE_INCREMENTAL_MIP
+    return dataCenter
+
+
+def assertSelectionCovers(dataCenter):
+    seen = set()
+    for j in dataCenter.grid.selectedCandidates():
+        seen.update(dataCenter.grid.visibleRacks[j])
+    assert seen == set(range(len(dataCenter.racks)))
+
+
+def solve(dataCenter):
+    dataCenter.generateGuardingMatrix()
+    numGuards = dataCenter.findMinimalGuardSet()
+    assert numGuards == len(dataCenter.grid.selectedCandidates())
+    assertSelectionCovers(dataCenter)
+    return numGuards
+
+
+def test_candidates_replaced_by_as_many_in_another_order(smallDataCenter):
+    dataCenter = incremental(smallDataCenter)
+    dataCenter.generateArrangementCandidates()
+    numGuards = solve(dataCenter)
+    (xs, ys) = dataCenter.grid.candidateLocations()
+    dataCenter.grid.setCandidateLocations(np.roll(xs, 1), np.roll(ys, 1))
+    assert solve(dataCenter) == numGuards
+
+
+def test_candidates_replaced_by_a_reordered_superset(smallDataCenter):
+    dataCenter = incremental(smallDataCenter)
+    dataCenter.grid.generateCandidateGuardSet()
+    solve(dataCenter)
+    (xs, ys) = dataCenter.grid.candidateLocations()
+    dataCenter.grid.setCandidateLocations(np.concatenate(([50.0], xs[::-1])), np.concatenate(([70.0], ys[::-1])))
+    solve(dataCenter)
+
+
+def test_appended_candidates_extend_the_model(smallDataCenter):
+    dataCenter = incremental(smallDataCenter)
+    dataCenter.grid.generateCandidateGuardSet()
+    solve(dataCenter)
+    generation = dataCenter.grid.candidateGeneration
+    dataCenter.grid.refineGrid()
+    dataCenter.grid.generateCandidateGuardSet()
+    assert dataCenter.grid.candidateGeneration == generation
+    solve(dataCenter)
+    assert dataCenter.coverModelGeneration == generation
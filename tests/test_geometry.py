@@ -0,0 +1,148 @@
+import random
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+import geometry2D
+from geometry2D import *
+
+
+def referenceSign(x1, y1, x2, y2, px, py): #the orientation determinant's sign, computed here independently of geometry2D
+    val = (Fraction(y2) - Fraction(y1))*(Fraction(px) - Fraction(x2)) - (Fraction(x2) - Fraction(x1))*(Fraction(py) - Fraction(y2))
+    return (val > 0) - (val < 0)
+
+
+def naiveSign(x1, y1, x2, y2, px, py):
+    val = ((y2 - y1) * (px - x2)) - ((x2 - x1) * (py - y2))
+    return (val > 0) - (val < 0)
+
+
+def nearlyColinearCases():
+    #(x1, y1, x2, y2, px, py): points exactly on long lines through the origin (scaled by powers of 2, so
+    #the coordinates are exact), the same points 2^-50 (relative) off the line, and rounded interpolations
+    cases = []
+    for (dx, dy) in [(0.1, 0.7), (0.3, 0.2), (1.0/3.0, 2.0/3.0), (0.7, -0.9)]:
+        (x2, y2) = (dx*2.0**40, dy*2.0**40)
+        for k in range(-10, 45, 3):
+            (px, py) = (dx*2.0**k, dy*2.0**k)
+            cases.append((0.0, 0.0, x2, y2, px, py))
+            cases.append((0.0, 0.0, x2, y2, px, py + abs(py)*2.0**-50))
+            cases.append((0.0, 0.0, x2, y2, px, py - abs(py)*2.0**-50))
+            cases.append((px, py, x2, y2, 0.0, 0.0))
+    rng = random.Random(24)
+    for n in range(2000):
+        (x1, y1, x2, y2) = (rng.uniform(-1e3, 1e3), rng.uniform(-1e3, 1e3), rng.uniform(-1e3, 1e3), rng.uniform(-1e3, 1e3))
+        t = rng.uniform(-2.0, 3.0)
+        cases.append((x1, y1, x2, y2, x1 + t*(x2 - x1), y1 + t*(y2 - y1)))
+    return cases
+
+
+CASES = nearlyColinearCases()
+
+
+def test_cases_need_the_exact_fallback(monkeypatch):
+    calls = []
+    def countingExactOrientationSign(*args):
+        calls.append(args)
+        return exactOrientationSign(*args)
+    monkeypatch.setattr(geometry2D, "exactOrientationSign", countingExactOrientationSign)
+    for case in CASES:
+        geometry2D.orientationSign(*case)
+    assert len(calls) > len(CASES)//2
+    assert any(naiveSign(*case) != referenceSign(*case) for case in CASES) #plain floating point gets some of them wrong
+
+
+def test_scalar_signs_are_exact():
+    for case in CASES:
+        expected = referenceSign(*case)
+        assert exactOrientationSign(*case) == expected
+        assert orientationSign(*case) == expected
+        assert edgeOrientationSign(edgeCoefficients(*case[:4]), *case[4:]) == expected
+
+
+def test_orientation_from_coordinates_matches_segment():
+    names = {1: Segment.CLOCKWISE, -1: Segment.COUNTERCLOCKWISE, 0: Segment.COLINEAR}
+    for case in CASES[:200]:
+        (x1, y1, x2, y2, px, py) = case
+        assert orientationFromCoordinates(*case) == names[referenceSign(*case)]
+        assert Segment(Point(x1, y1), Point(x2, y2)).orientation(Point(px, py)) == names[referenceSign(*case)]
+
+
+def test_array_signs_are_exact():
+    columns = [np.array(column) for column in zip(*CASES)]
+    signs = orientationArray(*columns)
+    assert signs.tolist() == [referenceSign(*case) for case in CASES]
+
+
+def test_array_signs_broadcast():
+    (x2, y2) = (0.1*2.0**40, 0.7*2.0**40)
+    ks = np.arange(-10, 45)
+    (px, py) = (0.1*2.0**ks, 0.7*2.0**ks)
+    signs = orientationArray(0.0, 0.0, x2, y2, px[:, None], np.stack((py, py*(1 + 2.0**-50)), axis=1))
+    assert signs.shape == (len(ks), 2)
+    for k in range(len(ks)):
+        assert signs[k, 0] == referenceSign(0.0, 0.0, x2, y2, px[k], py[k])
+        assert signs[k, 1] == referenceSign(0.0, 0.0, x2, y2, px[k], py[k]*(1 + 2.0**-50))
+
+
+def smallIntegerPoints(rng, n):
+    #coordinates in 0..4, so shared endpoints, colinear triples and points on boundaries come up often
+    return PointArray(np.array([float(rng.randint(0, 4)) for k in range(n)]), np.array([float(rng.randint(0, 4)) for k in range(n)]))
+
+
+def smallIntegerSegments(rng, n):
+    (starts, ends) = (smallIntegerPoints(rng, n), smallIntegerPoints(rng, n))
+    return SegmentArray(starts.xs, starts.ys, ends.xs, ends.ys)
+
+
+N = 3000
+
+
+def test_point_array_inside_triangles_matches_triangle():
+    rng = random.Random(23)
+    (points, pt1s, pt2s, pt3s) = (smallIntegerPoints(rng, N), smallIntegerPoints(rng, N), smallIntegerPoints(rng, N), smallIntegerPoints(rng, N))
+    inside = points.insideTriangles(pt1s, pt2s, pt3s)
+    for k in range(N):
+        assert inside[k] == Triangle(pt1s.point(k), pt2s.point(k), pt3s.point(k)).pointInside(points.point(k))
+
+
+def test_segment_array_point_on_matches_segment():
+    rng = random.Random(23)
+    (segs, points) = (smallIntegerSegments(rng, N), smallIntegerPoints(rng, N))
+    on = segs.pointOn(points)
+    for k in range(N):
+        assert on[k] == segs.segment(k).pointOn(points.point(k))
+
+
+def test_segment_array_intersects_matches_segment():
+    rng = random.Random(23)
+    (segs, others) = (smallIntegerSegments(rng, N), smallIntegerSegments(rng, N))
+    intersects = segs.intersects(others)
+    for k in range(N):
+        assert intersects[k] == segs.segment(k).intersectsWithSegment(others.segment(k))
+
+
+def test_segment_array_intersects_triangles_matches_triangle():
+    rng = random.Random(23)
+    (segs, pt1s, pt2s, pt3s) = (smallIntegerSegments(rng, N), smallIntegerPoints(rng, N), smallIntegerPoints(rng, N), smallIntegerPoints(rng, N))
+    intersects = segs.intersectsTriangles(pt1s, pt2s, pt3s)
+    for k in range(N):
+        assert intersects[k] == Triangle(pt1s.point(k), pt2s.point(k), pt3s.point(k)).intersectsWithSegment(segs.segment(k))
+
+
+def test_segment_array_distance_matches_segment():
+    rng = random.Random(23)
+    (segs, points) = (smallIntegerSegments(rng, N), smallIntegerPoints(rng, N))
+    distances = segs.distanceFromPoints(points)
+    for k in range(N):
+        assert distances[k] == pytest.approx(segs.segment(k).distanceFromPoint(points.point(k)), abs=1e-12)
+
+
+def test_rect_distance_from_points_matches_rect():
+    rng = random.Random(23)
+    points = smallIntegerPoints(rng, N)
+    rect = Rect(Point(1.0, 1.0), Point(3.0, 4.0))
+    distances = rect.distanceFromPoints(points)
+    for k in range(N):
+        assert distances[k] == pytest.approx(rect.distanceFromPoint(points.point(k)), abs=1e-12)
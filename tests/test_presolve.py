@@ -0,0 +1,107 @@
+import itertools
+import random
+
+from presolve import *
+
+
+def isCover(rackSets, columns):
+    return all(not set(s).isdisjoint(columns) for s in rackSets)
+
+
+def bruteForceMinimum(rackSets, numColumns):
+    #size of a minimum cover by trying every set of columns, None if there is none
+    for size in range(numColumns + 1):
+        for columns in itertools.combinations(range(numColumns), size):
+            if isCover(rackSets, columns):
+                return size
+    return None
+
+
+def randomInstance(rng):
+    numColumns = rng.randint(1, 8)
+    numRacks = rng.randint(1, 7)
+    return ([sorted(rng.sample(range(numColumns), rng.randint(1, min(3, numColumns)))) for i in range(numRacks)], numColumns)
+
+
+#Each hand-built instance ends in the same three racks seen by three columns two at a time (a cycle),
+#which no reduction applies to
+
+def test_rack_with_a_single_column_forces_it():
+    #rack 0 is seen only by column 0, which also covers rack 1; column 4 then covers nothing left
+    presolve = presolveCover([[0], [0, 4], [1, 2], [2, 3], [3, 1]], 5)
+    assert presolve.forced == [0]
+    assert presolve.numRacksCoveredByForced == 2
+    assert presolve.racks == [2, 3, 4]
+    assert presolve.columns == [1, 2, 3]
+    assert presolve.rackSets == [[0, 1], [1, 2], [0, 2]]
+
+
+def test_rack_containing_another_racks_columns_is_dominated():
+    #covering rack 0 (columns 0 or 1) covers rack 1 (columns 0, 1 or 2) too
+    presolve = presolveCover([[0, 1], [0, 1, 2], [1, 2], [2, 0]], 3)
+    assert presolve.numRacksDominated == 1
+    assert presolve.racks == [0, 2, 3]
+    assert presolve.columns == [0, 1, 2]
+    assert presolve.forced == []
+
+
+def test_identical_racks_keep_the_first():
+    assert CoverPresolve.undominatedRacks([0, 1, 2], [{0, 1}, {0, 1}, {1, 2}]) == [0, 2]
+
+
+def test_column_covering_a_subset_of_another_is_dropped():
+    #column 3 covers only rack 0, which column 1 covers along with rack 2
+    presolve = presolveCover([[1, 2, 3], [2, 0], [0, 1]], 4)
+    assert presolve.numColumnsDominated == 1
+    assert presolve.columns == [0, 1, 2]
+    assert presolve.racks == [0, 1, 2]
+    assert presolve.rackSets == [[1, 2], [0, 2], [0, 1]]
+
+
+def test_uncovered_rack_is_infeasible():
+    presolve = presolveCover([[0], []], 1)
+    assert presolve.infeasible
+
+
+def test_solution_puts_forced_columns_first():
+    presolve = presolveCover([[0], [0, 4], [1, 2], [2, 3], [3, 1]], 5)
+    assert presolve.solution([2, 0]) == [0, 3, 1]
+
+
+def test_reduced_cover_replaces_dropped_columns():
+    presolve = presolveCover([[1, 2, 3], [2, 0], [0, 1]], 4)
+    reduced = presolve.reducedCover({3, 0}) #column 3 was dropped, column 1 stands in for it
+    assert reduced == [0, 1]
+    assert isCover(presolve.originalRackSets, presolve.solution(reduced))
+
+
+def test_reduced_cover_of_a_non_cover_is_none():
+    presolve = presolveCover([[1, 2, 3], [2, 0], [0, 1]], 4)
+    assert presolve.reducedCover(set()) == None
+    assert presolve.reducedCover({3}) == None
+
+
+def test_presolve_keeps_the_optimum_on_random_instances():
+    rng = random.Random(12)
+    for n in range(300):
+        (rackSets, numColumns) = randomInstance(rng)
+        presolve = presolveCover(rackSets, numColumns)
+        assert not presolve.infeasible
+        optimum = bruteForceMinimum(rackSets, numColumns)
+        reducedOptimum = bruteForceMinimum(presolve.rackSets, len(presolve.columns))
+        assert len(presolve.forced) + reducedOptimum == optimum
+
+        for columns in itertools.combinations(range(len(presolve.columns)), reducedOptimum):
+            if isCover(presolve.rackSets, columns):
+                solution = presolve.solution(list(columns))
+                assert isCover(rackSets, solution)
+                assert len(solution) == optimum
+                break
+
+        for columns in itertools.combinations(range(numColumns), optimum):
+            if isCover(rackSets, columns):
+                reduced = presolve.reducedCover(set(columns))
+                assert reduced != None
+                assert isCover(presolve.rackSets, reduced)
+                assert isCover(rackSets, presolve.solution(reduced))
+                break
@@ -0,0 +1,53 @@
+from dataCenter import *
+
+
+def scriptedSolver(dataCenter, results):
+    #findMinimalGuardSet replacement returning the given guard counts in turn (None: no cover found)
+    def findMinimalGuardSet(previousGuards=None):
+        dataCenter.guardLowerBound = None
+        return results.pop(0)
+    return findMinimalGuardSet
+
+
+def test_rounds_without_cover_do_not_converge(smallDataCenter):
+    smallDataCenter.findMinimalGuardSet = scriptedSolver(smallDataCenter, [None, None, 3, 3, 3])
+    history = smallDataCenter.refineUntilConverged(stableRounds=1, maxIterations=5)
+    assert [entry["numGuards"] for entry in history] == [None, None, 3, 3]
+    assert smallDataCenter.refinementStopReason == DataCenter.STOP_UNCHANGED
+
+
+def test_no_cover_at_all_stops_at_the_iteration_limit(smallDataCenter):
+    smallDataCenter.findMinimalGuardSet = scriptedSolver(smallDataCenter, [None, None, None])
+    history = smallDataCenter.refineUntilConverged(stableRounds=1, maxIterations=3)
+    assert [entry["numGuards"] for entry in history] == [None, None, None]
+    assert smallDataCenter.refinementStopReason == DataCenter.STOP_MAX_ITERATIONS
+
+
+def history(dataCenter, **options):
+    return [(entry["numCandidates"], entry["numGuards"]) for entry in dataCenter.refineUntilConverged(maxIterations=6, **options)]
+
+
+def test_refinement_stops_once_the_guard_count_settles(smallDataCenter):
+    assert history(smallDataCenter, stableRounds=1) == [(25, 2), (125, 2)]
+    assert smallDataCenter.refinementStopReason == DataCenter.STOP_UNCHANGED
+    assert len(smallDataCenter.grid.selectedCandidates()) == 2
+
+
+def test_more_stable_rounds_refine_further(smallDataCenter):
+    assert history(smallDataCenter, stableRounds=2) == [(25, 2), (125, 2), (525, 2)]
+    assert smallDataCenter.refinementStopReason == DataCenter.STOP_UNCHANGED
+
+
+def test_witness_bound_stops_at_the_first_optimal_round(smallDataCenter):
+    assert smallDataCenter.witnessLowerBound() == 2
+    assert history(smallDataCenter, stableRounds=1, useWitnessBound=True) == [(25, 2)]
+    assert smallDataCenter.refinementStopReason == DataCenter.STOP_LOWER_BOUND
+
+
+def test_witness_bound_is_opt_in(smallDataCenter):
+    def witnessLowerBound():
+        raise AssertionError("witnessLowerBound called without useWitnessBound")
+    smallDataCenter.witnessLowerBound = witnessLowerBound
+    history = smallDataCenter.refineUntilConverged(stableRounds=1, maxIterations=3)
+    assert smallDataCenter.refinementStopReason != DataCenter.STOP_LOWER_BOUND
+    assert history[-1]["numGuards"] != None
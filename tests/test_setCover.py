@@ -0,0 +1,64 @@
+import itertools
+import random
+
+import dataCenter as dataCenterModule
+from setCover import *
+from dataCenter import *
+
+
+def isCover(rackSets, columns):
+    return all(not set(s).isdisjoint(columns) for s in rackSets)
+
+
+def bruteForceMinimum(rackSets, numColumns):
+    for size in range(numColumns + 1):
+        for columns in itertools.combinations(range(numColumns), size):
+            if isCover(rackSets, columns):
+                return size
+    return None
+
+
+def test_exact_set_cover_is_minimum_on_random_instances():
+    rng = random.Random(15)
+    for n in range(300):
+        numColumns = rng.randint(1, 10)
+        numRacks = rng.randint(1, 9)
+        rackSets = [sorted(rng.sample(range(numColumns), rng.randint(1, min(4, numColumns)))) for i in range(numRacks)]
+        cover = exactSetCover(rackSets, numColumns)
+        assert cover == sorted(set(cover))
+        assert isCover(rackSets, cover)
+        assert len(cover) == bruteForceMinimum(rackSets, numColumns)
+
+
+def test_exact_set_cover_of_uncoverable_rack_is_none():
+    assert exactSetCover([[0, 1], []], 2) == None
+
+
+def test_exact_set_cover_gives_up_after_max_nodes():
+    rackSets = [[i, (i + 1) % 7] for i in range(7)] #seven racks in a cycle, each seen by two columns
+    assert len(exactSetCover(rackSets, 7)) == 4
+    assert exactSetCover(rackSets, 7, maxNodes=0) == None
+
+
+def test_find_minimal_guard_set_falls_back_to_cbc(smallDataCenter, monkeypatch):
+    #SOLVE_AUTO uses exactSetCover for so few racks; when it gives up (None), CBC must find the same optimum
+    calls = []
+    def spy(name, function):
+        def counting(*args):
+            result = function(*args)
+            calls.append((name, result))
+            return result
+        return counting
+    monkeypatch.setattr(dataCenterModule, "exactSetCover", spy("exact", exactSetCover))
+    smallDataCenter.solveCoverByMIP = spy("mip", smallDataCenter.solveCoverByMIP)
+    smallDataCenter.grid.generateCandidateGuardSet()
+    smallDataCenter.generateGuardingMatrix()
+    
+    expected = smallDataCenter.findMinimalGuardSet()
+    assert [name for (name, result) in calls] == ["exact"]
+    
+    del calls[:]
+    monkeypatch.setattr(DataCenter, "EXACT_SOLVER_MAX_NODES", 0)
+    assert smallDataCenter.findMinimalGuardSet() == expected
+    assert [name for (name, result) in calls] == ["exact", "mip"]
+    assert calls[0][1] == None
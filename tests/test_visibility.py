@@ -0,0 +1,104 @@
+import random
+
+import numpy as np
+import pytest
+
+from dataCenter import *
+
+
+MODELS = [(DataCenter.POSERS_CHOICE, DataCenter.COMPLETE_COVERAGE), (DataCenter.SOLVERS_CHOICE, DataCenter.COMPLETE_COVERAGE),
+          (DataCenter.POSERS_CHOICE, DataCenter.ALL_BUT_DELTA_COVERAGE), (DataCenter.SOLVERS_CHOICE, DataCenter.ALL_BUT_DELTA_COVERAGE)]
+ENGINES = [DataCenter.VISIBILITY_VECTORIZED, DataCenter.VISIBILITY_REGIONS] #compared with guardCanSeeRack (REGIONS only differs under COMPLETE_COVERAGE)
+
+
+def scalarVisibleRacks(dataCenter):
+    return [tuple(i for i in range(len(dataCenter.racks)) if dataCenter.guardCanSeeRack(j, i))
+            for j in range(dataCenter.grid.numCandidates())]
+
+
+def engineVisibleRacks(dataCenter, engine):
+    dataCenter.setVisibilityEngine(engine)
+    return list(dataCenter.computeVisibleRacks(range(dataCenter.grid.numCandidates())))
+
+
+def assertEnginesAgree(dataCenter, model, coverage):
+    dataCenter.setGuardingModel(model, coverage, 2.0)
+    expected = scalarVisibleRacks(dataCenter)
+    for engine in ENGINES:
+        assert engineVisibleRacks(dataCenter, engine) == expected
+
+
+@pytest.mark.parametrize("model,coverage", MODELS)
+def test_random_layout(model, coverage):
+    random.seed(7)
+    dataCenter = DataCenter(Rect(Point(0.0, 0.0), Point(100.0, 100.0)), 3.0)
+    dataCenter.placeRandomOrthogonalRacks(12, growthMethod=DataCenter.GROW_ONE_BY_ONE)
+    dataCenter.createInitialGrid()
+    dataCenter.grid.generateCandidateGuardSet()
+    dataCenter.grid.refineGrid()
+    dataCenter.grid.generateCandidateGuardSet()
+    assertEnginesAgree(dataCenter, model, coverage)
+
+
+def boundaryDataCenter():
+    #two racks on the line y = 50 (one guarding up, one down), a rack in front of them and one
+    #that ends exactly on the extension of another's line
+    dataCenter = DataCenter(Rect(Point(0.0, 0.0), Point(100.0, 100.0)), 3.0)
+    dataCenter.racks = [Rack(Segment(Point(10.0, 50.0), Point(40.0, 50.0)), Rack.UP),
+                        Rack(Segment(Point(60.0, 50.0), Point(90.0, 50.0)), Rack.DOWN),
+                        Rack(Segment(Point(40.0, 70.0), Point(60.0, 70.0)), Rack.DOWN),
+                        Rack(Segment(Point(70.0, 10.0), Point(70.0, 40.0)), Rack.LEFT),
+                        Rack(Segment(Point(20.0, 10.0), Point(20.0, 40.0)), Rack.RIGHT)]
+    dataCenter.createInitialGrid()
+    return dataCenter
+
+
+def boundaryLocations(dataCenter):
+    #rack endpoints and midpoints, points on the racks' lines beyond their ends, and points on the
+    #lines through one rack's endpoint and another's (where the shadows begin)
+    locations = []
+    for rack in dataCenter.racks:
+        (x1, y1, x2, y2) = (rack.seg.x1, rack.seg.y1, rack.seg.x2, rack.seg.y2)
+        locations.extend([(x1, y1), (x2, y2), ((x1 + x2)/2.0, (y1 + y2)/2.0), (2*x1 - x2, 2*y1 - y2), (2*x2 - x1, 2*y2 - y1)])
+    ends = [(rack.seg.x1, rack.seg.y1) for rack in dataCenter.racks] + [(rack.seg.x2, rack.seg.y2) for rack in dataCenter.racks]
+    for (px, py) in ends:
+        for (qx, qy) in ends:
+            if (px, py) != (qx, qy):
+                for t in (0.5, 2.0, 3.0):
+                    locations.append((px + t*(qx - px), py + t*(qy - py)))
+    locations = [(x, y) for (x, y) in locations if 0.0 <= x <= 100.0 and 0.0 <= y <= 100.0]
+    return (np.array([x for (x, y) in locations]), np.array([y for (x, y) in locations]))
+
+
+@pytest.mark.parametrize("model,coverage", MODELS)
+def test_boundary_and_colinear_locations(model, coverage):
+    dataCenter = boundaryDataCenter()
+    dataCenter.grid.setCandidateLocations(*boundaryLocations(dataCenter))
+    assertEnginesAgree(dataCenter, model, coverage)
+
+
+def test_guards_on_the_line_of_colinear_racks():
+    dataCenter = boundaryDataCenter()
+    dataCenter.grid.setCandidateLocations(np.array([5.0, 50.0, 95.0]), np.array([50.0, 50.0, 50.0]))
+    dataCenter.setGuardingModel(DataCenter.SOLVERS_CHOICE, DataCenter.COMPLETE_COVERAGE, 0.0)
+    racks = scalarVisibleRacks(dataCenter)
+    for engine in ENGINES:
+        assert engineVisibleRacks(dataCenter, engine) == racks
+    for seen in racks: #a guard on the racks' shared line sees neither of them (its guarding triangles are degenerate)
+        assert 0 not in seen and 1 not in seen
+
+
+@pytest.mark.parametrize("engine", [DataCenter.VISIBILITY_SCALAR] + ENGINES)
+def test_process_pool_matches_sequential(engine, monkeypatch):
+    random.seed(11)
+    dataCenter = DataCenter(Rect(Point(0.0, 0.0), Point(100.0, 100.0)), 3.0)
+    dataCenter.placeRandomOrthogonalRacks(10, growthMethod=DataCenter.GROW_ONE_BY_ONE)
+    dataCenter.createInitialGrid()
+    dataCenter.grid.generateCandidateGuardSet()
+    dataCenter.grid.refineGrid()
+    dataCenter.grid.generateCandidateGuardSet()
+    sequential = engineVisibleRacks(dataCenter, engine)
+    
+    monkeypatch.setattr(DataCenter, "PARALLEL_MIN_CANDIDATES", 10)
+    dataCenter.setNumVisibilityWorkers(3)
+    assert engineVisibleRacks(dataCenter, engine) == sequential